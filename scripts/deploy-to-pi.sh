@@ -12,6 +12,7 @@ rsync -avz --delete \
   --include='src/voice_agent/' \
   --include='src/voice_agent/__init__.py' \
   --include='src/voice_agent/proxy.py' \
+  --include='src/voice_agent/_conversation_log.py' \
   --exclude='src/voice_agent/*.py' \
   --include='chat-ui/' \
   --include='chat-ui/dist/' \
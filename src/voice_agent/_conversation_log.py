@@ -0,0 +1,94 @@
+"""Tail reads of daily conversation logs, shared by the server and the Pi proxy."""
+
+import functools
+import os
+from pathlib import Path
+
+# Markers written by log_conversation in main.py
+USER_MARKER = b"**Kevin:** "
+AGENT_MARKER = b"**Agent:** "
+# A user message runs until a blank line or the next **...** marker
+USER_END_MARKERS = (b"\n\n", b"\n**")
+# An agent response runs until the next section or its thinking block
+AGENT_END_MARKERS = (b"\n## ", b"\n**Agent thinking:**")
+
+# Bytes read from the end of a log before falling back to the whole file
+TAIL_BYTES = 64 * 1024
+
+
+def _last_section(data: bytes, header: bytes, end_markers: tuple[bytes, ...]) -> str | None:
+    """Return the text after the last `header` in a chunk of log bytes, if any."""
+    start = data.rfind(header)
+    if start == -1:
+        return None
+    start += len(header)
+
+    end = len(data)
+    for marker in end_markers:
+        pos = data.find(marker, start)
+        if pos != -1:
+            end = min(end, pos)
+
+    return data[start:end].decode("utf-8", errors="replace").strip()
+
+
+def _tail_section(path: Path, header: bytes, end_markers: tuple[bytes, ...]) -> str | None:
+    """
+    Get the text after the last `header` in a conversation log.
+
+    Only the tail of the file is read; the full file is scanned only when the
+    last section started before the tail window. Returns None if the file is
+    missing or has no such section.
+    """
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, 2)
+            f.seek(max(0, size - TAIL_BYTES))
+            text = _last_section(f.read(), header, end_markers)
+            if text is None and size > TAIL_BYTES:
+                f.seek(0)
+                text = _last_section(f.read(), header, end_markers)
+    except OSError:
+        return None
+    return text
+
+
+# Keyed by (path, st_mtime_ns, st_size): logs are only ever appended to or
+# rewritten, so an unchanged stat means the cached section is still valid
+@functools.lru_cache(maxsize=256)
+def _cached_tail_section(
+    path: str,
+    mtime_ns: int,
+    size: int,
+    header: bytes,
+    end_markers: tuple[bytes, ...],
+) -> str | None:
+    return _tail_section(Path(path), header, end_markers)
+
+
+def last_section(
+    path: Path,
+    header: bytes,
+    end_markers: tuple[bytes, ...],
+    st: os.stat_result | None = None,
+) -> str | None:
+    """Cached `_tail_section`, re-read only when the file's stat changes.
+
+    Pass `st` when the caller already has the file's stat (e.g. from scandir).
+    """
+    if st is None:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+    return _cached_tail_section(str(path), st.st_mtime_ns, st.st_size, header, end_markers)
+
+
+def last_user_message(path: Path, st: os.stat_result | None = None) -> str | None:
+    """Last user message in a conversation log, or None if there is none."""
+    return last_section(path, USER_MARKER, USER_END_MARKERS, st)
+
+
+def last_agent_response(path: Path, st: os.stat_result | None = None) -> str | None:
+    """Last non-empty agent response in a conversation log, or None."""
+    return last_section(path, AGENT_MARKER, AGENT_END_MARKERS, st) or None
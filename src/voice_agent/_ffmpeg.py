@@ -0,0 +1,149 @@
+"""Shared ffmpeg audio encoding for TTS output."""
+
+import asyncio
+import os
+from collections.abc import AsyncIterable
+
+# No stdin interaction, no banner, errors only, and a single encoder thread
+# (clips are short; several encodes may run at once)
+BASE_ARGS = [
+    "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-threads", "1",
+]
+
+# Codec and default bitrate per output container
+CODECS = {
+    "ogg": ("libopus", "64k"),
+    "mp3": ("libmp3lame", "128k"),
+}
+
+# Pipe read size when collecting ffmpeg output
+READ_SIZE = 64 * 1024
+
+# Bounded so concurrent syntheses don't oversubscribe the CPU
+_slots = asyncio.Semaphore(min(4, os.cpu_count() or 1))
+
+
+def _build_args(
+    input_fmt: str,
+    sample_rate: int | None,
+    channels: int | None,
+    output_fmt: str,
+    bitrate: str | None,
+) -> list[str]:
+    """Build the ffmpeg command for a pipe-to-pipe encode."""
+    codec, default_bitrate = CODECS[output_fmt]
+
+    args = [*BASE_ARGS, "-f", input_fmt]
+    if sample_rate is not None:
+        args += ["-ar", str(sample_rate)]
+    if channels is not None:
+        args += ["-ac", str(channels)]
+    args += [
+        "-i", "pipe:0",
+        "-c:a", codec,
+        "-b:a", bitrate or default_bitrate,
+        "-f", output_fmt,
+        "pipe:1",
+    ]
+    return args
+
+
+async def encode(
+    data: bytes | bytearray,
+    *,
+    input_fmt: str,
+    sample_rate: int | None = None,
+    channels: int | None = None,
+    output_fmt: str = "ogg",
+    bitrate: str | None = None,
+) -> bytes:
+    """
+    Encode audio piped through ffmpeg, without blocking the event loop.
+
+    Args:
+        data: Input audio (container bytes or raw PCM)
+        input_fmt: ffmpeg input format (e.g. "wav", "mp3", "f32le")
+        sample_rate: Input sample rate, required for raw PCM
+        channels: Input channel count, required for raw PCM
+        output_fmt: Output container, "ogg" (Opus) or "mp3"
+        bitrate: Output bitrate, defaults per container
+
+    Returns:
+        Encoded audio bytes.
+
+    Raises:
+        RuntimeError: If ffmpeg fails.
+    """
+    async def once():
+        yield data
+
+    args = _build_args(input_fmt, sample_rate, channels, output_fmt, bitrate)
+    return await _run(args, once())
+
+
+async def encode_stream(
+    chunks: AsyncIterable[bytes],
+    *,
+    input_fmt: str,
+    sample_rate: int | None = None,
+    channels: int | None = None,
+    output_fmt: str = "ogg",
+    bitrate: str | None = None,
+) -> bytes:
+    """
+    Like encode(), but feed ffmpeg's stdin from chunks as they arrive.
+
+    ffmpeg starts encoding the first chunk while later ones are still being
+    produced. Arguments and errors are as for encode().
+    """
+    args = _build_args(input_fmt, sample_rate, channels, output_fmt, bitrate)
+    return await _run(args, chunks)
+
+
+async def _read_all(stream: asyncio.StreamReader) -> bytes:
+    """Drain a pipe in fixed-size reads, joined once at the end."""
+    chunks = []
+    while chunk := await stream.read(READ_SIZE):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _run(args: list[str], chunks: AsyncIterable[bytes]) -> bytes:
+    """
+    Run ffmpeg, writing chunks to stdin while stdout/stderr are drained.
+
+    Writing and reading concurrently keeps either pipe from filling up and
+    stalling ffmpeg, and output is collected as it is produced.
+    """
+    async with _slots:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+
+        async def feed() -> None:
+            try:
+                async for chunk in chunks:
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg exited early; its stderr says why
+            finally:
+                proc.stdin.close()
+
+        try:
+            _, stdout, stderr = await asyncio.gather(
+                feed(), _read_all(proc.stdout), _read_all(proc.stderr)
+            )
+        except BaseException:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            raise
+        await proc.wait()
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode()}")
+    return stdout
@@ -0,0 +1,259 @@
+"""In-process Ogg Opus encoding of raw PCM, with ffmpeg as fallback."""
+
+import asyncio
+import logging
+import random
+import struct
+import zlib
+from collections.abc import AsyncIterable
+
+from voice_agent import _ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# opuslib is optional (pip install voice-agent[opus]); it raises a plain
+# Exception at import time when the libopus shared library is missing
+try:
+    import opuslib
+except Exception:
+    opuslib = None
+
+# Sample rates libopus accepts natively; anything else goes through ffmpeg
+OPUS_RATES = {8000, 12000, 16000, 24000, 48000}
+
+# Same target bitrate as the ffmpeg path
+BITRATE = 64000
+
+# 20 ms frames, the Opus default
+FRAMES_PER_SECOND = 50
+
+# Ogg Opus granule positions always count 48 kHz samples
+GRANULE_RATE = 48000
+
+# Fallback pre-skip (libopus lookahead at 48 kHz) if the encoder won't report it
+DEFAULT_PRE_SKIP = 312
+
+# Ogg page header flags
+_BOS = 0x02
+_EOS = 0x04
+
+# Byte-wise bit reversal, used to compute the (non-reflected) Ogg CRC with zlib
+_REV8 = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def _ogg_crc(data: bytes) -> int:
+    """Ogg page CRC-32 (poly 0x04C11DB7, no reflection, zero init/xor)."""
+    crc = zlib.crc32(data.translate(_REV8), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{crc:032b}"[::-1], 2)
+
+
+def _ogg_page(
+    packets: list[bytes], granule: int, serial: int, seq: int, flags: int = 0
+) -> bytes:
+    """Build one Ogg page holding whole packets."""
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+
+    header = b"OggS" + struct.pack(
+        "<BBqIIIB", 0, flags, granule, serial, seq, 0, len(lacing)
+    ) + lacing
+    page = bytearray(header + b"".join(packets))
+    struct.pack_into("<I", page, 22, _ogg_crc(bytes(page)))
+    return bytes(page)
+
+
+class _OggOpusEncoder:
+    """
+    Incremental Ogg Opus encoder (RFC 7845) over libopus.
+
+    PCM can be fed in arbitrary chunks; whole 20 ms frames are encoded as
+    soon as they are available and the Ogg pages are built as they fill.
+    """
+
+    def __init__(self, sample_rate: int, channels: int) -> None:
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+        self._encoder = opuslib.Encoder(sample_rate, channels, "voip")
+        self._encoder.bitrate = BITRATE
+        try:
+            self.pre_skip = self._encoder.lookahead * (GRANULE_RATE // sample_rate)
+        except Exception:
+            self.pre_skip = DEFAULT_PRE_SKIP
+
+        self._frame_size = sample_rate // FRAMES_PER_SECOND
+        self._frame_bytes = self._frame_size * channels * 4
+        self._pending = bytearray()
+        self._total_bytes = 0
+
+        self._serial = random.getrandbits(32)
+        self._seq = 0
+        self._packets = 0
+        self._page: list[bytes] = []
+        self._segments = 0
+
+        head = b"OpusHead" + struct.pack(
+            "<BBHIhB", 1, channels, self.pre_skip, sample_rate, 0, 0
+        )
+        vendor = b"voice-agent"
+        tags = b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+        self._out = bytearray()
+        self._write_page([head], 0, _BOS)
+        self._write_page([tags], 0)
+
+    def _write_page(self, packets: list[bytes], granule: int, flags: int = 0) -> None:
+        self._out += _ogg_page(packets, granule, self._serial, self._seq, flags)
+        self._seq += 1
+
+    def _add_packet(self, packet: bytes) -> None:
+        needed = len(packet) // 255 + 1
+        if self._page and self._segments + needed > 255:
+            granule = self.pre_skip + self._packets * (GRANULE_RATE // FRAMES_PER_SECOND)
+            self._write_page(self._page, granule)
+            self._page, self._segments = [], 0
+        self._page.append(packet)
+        self._segments += needed
+        self._packets += 1
+
+    def feed(self, pcm: bytes | bytearray) -> None:
+        """Encode every whole frame available after appending pcm."""
+        self._pending += pcm
+        self._total_bytes += len(pcm)
+
+        frame_bytes = self._frame_bytes
+        usable = len(self._pending) - len(self._pending) % frame_bytes
+        view = memoryview(self._pending)
+        for start in range(0, usable, frame_bytes):
+            frame = bytes(view[start:start + frame_bytes])
+            self._add_packet(self._encoder.encode_float(frame, self._frame_size))
+        view.release()
+        del self._pending[:usable]
+
+    def finish(self) -> bytes:
+        """Flush the final (zero-padded) frame and return the whole stream."""
+        if self._pending:
+            self._pending += b"\x00" * (self._frame_bytes - len(self._pending))
+            self.feed(b"")
+
+        num_samples = self._total_bytes // (self.channels * 4)
+        end_granule = self.pre_skip + num_samples * GRANULE_RATE // self.sample_rate
+        self._write_page(self._page, end_granule, _EOS)
+        self._page = []
+        return bytes(self._out)
+
+
+def _encode_opuslib(pcm: bytes | bytearray, sample_rate: int, channels: int) -> bytes:
+    """Encode interleaved float32 PCM to Ogg Opus with libopus (blocking)."""
+    encoder = _OggOpusEncoder(sample_rate, channels)
+    encoder.feed(pcm)
+    return encoder.finish()
+
+
+def _use_opuslib(sample_rate: int, channels: int) -> bool:
+    """Whether libopus can encode this input directly."""
+    return opuslib is not None and sample_rate in OPUS_RATES and channels in (1, 2)
+
+
+async def encode_pcm(
+    pcm: bytes | bytearray, *, sample_rate: int, channels: int = 1
+) -> bytes:
+    """
+    Encode raw float32 PCM to Opus in an Ogg container.
+
+    Uses libopus in-process when opuslib is installed and the input is a
+    native Opus rate, avoiding an ffmpeg subprocess per clip. Otherwise
+    pipes the PCM through ffmpeg.
+
+    Args:
+        pcm: Interleaved little-endian float32 samples
+        sample_rate: Input sample rate
+        channels: Input channel count
+
+    Returns:
+        Ogg Opus audio bytes.
+
+    Raises:
+        RuntimeError: If encoding fails.
+    """
+    if _use_opuslib(sample_rate, channels):
+        try:
+            return await asyncio.to_thread(_encode_opuslib, pcm, sample_rate, channels)
+        except Exception as e:
+            logger.warning(f"libopus encode failed, falling back to ffmpeg: {e}")
+
+    return await _ffmpeg.encode(
+        pcm, input_fmt="f32le", sample_rate=sample_rate, channels=channels
+    )
+
+
+async def encode_pcm_stream(
+    chunks: AsyncIterable[bytes], *, sample_rate: int, channels: int = 1
+) -> bytes:
+    """
+    Encode float32 PCM to Ogg Opus while it is still being produced.
+
+    Each chunk is encoded as soon as it arrives, so encoding overlaps with
+    whatever generates the audio instead of starting after it finishes. If
+    libopus fails part way, the whole stream is re-encoded with ffmpeg.
+
+    Args:
+        chunks: Interleaved little-endian float32 PCM, in order
+        sample_rate: Input sample rate
+        channels: Input channel count
+
+    Returns:
+        Ogg Opus audio bytes, or b"" if chunks yielded no audio.
+
+    Raises:
+        RuntimeError: If encoding fails.
+    """
+    chunks = aiter(chunks)
+    try:
+        first = await anext(chunks)
+    except StopAsyncIteration:
+        return b""
+
+    if not _use_opuslib(sample_rate, channels):
+        async def replay():
+            yield first
+            async for chunk in chunks:
+                yield chunk
+
+        return await _ffmpeg.encode_stream(
+            replay(), input_fmt="f32le", sample_rate=sample_rate, channels=channels
+        )
+
+    # Keep the PCM fed so far, so a libopus failure can fall back to ffmpeg
+    # as encode_pcm does. Errors from the chunk source itself propagate.
+    consumed = [first]
+    encoder: _OggOpusEncoder | None = None
+    try:
+        encoder = _OggOpusEncoder(sample_rate, channels)
+        await asyncio.to_thread(encoder.feed, first)
+    except Exception as e:
+        logger.warning(f"libopus encode failed, falling back to ffmpeg: {e}")
+        encoder = None
+
+    async for chunk in chunks:
+        consumed.append(chunk)
+        if encoder is None:
+            continue
+        try:
+            await asyncio.to_thread(encoder.feed, chunk)
+        except Exception as e:
+            logger.warning(f"libopus encode failed, falling back to ffmpeg: {e}")
+            encoder = None
+
+    if encoder is not None:
+        try:
+            return await asyncio.to_thread(encoder.finish)
+        except Exception as e:
+            logger.warning(f"libopus encode failed, falling back to ffmpeg: {e}")
+
+    return await _ffmpeg.encode(
+        b"".join(consumed),
+        input_fmt="f32le",
+        sample_rate=sample_rate,
+        channels=channels,
+    )
@@ -0,0 +1,26 @@
+"""Shared PyTorch memory release for the local TTS backends."""
+
+import gc
+import sys
+
+
+def release_memory(full: bool = False) -> None:
+    """
+    Return memory freed by dropped models.
+
+    Args:
+        full: Also run a full garbage collection. That sweep is slow, so it
+            is reserved for unloading everything (e.g. at shutdown), not
+            for evicting a single cached model.
+    """
+    if full:
+        gc.collect()
+
+    # Nothing to free if torch was never imported
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+
+    # Skip CPU-only runs and the no-op case of an empty CUDA cache
+    if torch.cuda.is_available() and torch.cuda.memory_reserved() > 0:
+        torch.cuda.empty_cache()
@@ -190,6 +190,11 @@ def get_success_chime(output_format: str = "ogg") -> bytes | None:
 
     silence_duration = float(os.getenv("NOTIFICATION_SILENCE", "0.5"))
 
+    # Notification bytes come from _sound_cache, so their hash is computed once
+    cache_key = f"chime:{output_format}:{silence_duration}:{hash(notification)}"
+    if cache_key in _sound_cache:
+        return _sound_cache[cache_key]
+
     import tempfile
 
     with tempfile.NamedTemporaryFile(suffix=f".{output_format}", delete=False) as f:
@@ -220,7 +225,18 @@ def get_success_chime(output_format: str = "ogg") -> bytes | None:
             logger.error(f"ffmpeg chime failed: {result.stderr.decode()}")
             return notification
 
+        _sound_cache[cache_key] = result.stdout
         return result.stdout
 
     finally:
-        Path(notif_path).unlink(missing_ok=True)
\ No newline at end of file
+        Path(notif_path).unlink(missing_ok=True)
+
+
+def preload_sounds(output_format: str = "ogg") -> None:
+    """Convert error sounds and the success chime ahead of first use."""
+    try:
+        for error_type in ERROR_SOUNDS:
+            get_error_sound(error_type, output_format)
+        get_success_chime(output_format)
+    except Exception as e:
+        logger.warning(f"Failed to preload sounds: {e}")
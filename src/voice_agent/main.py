@@ -1,23 +1,25 @@
 """FastAPI voice agent server."""
 
 import asyncio
-import atexit
 import json
 import logging
+import os
 import re
 import signal
-import tempfile
+import threading
 import time
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import AsyncIterator
+from typing import Any, AsyncIterator, Coroutine
 
+import orjson
 from fastapi import FastAPI, HTTPException, Request, UploadFile
 from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from voice_agent import _conversation_log
 from voice_agent.agents import (
     clear_last_command,
     extract_keywords_from_window,
@@ -27,8 +29,14 @@ from voice_agent.agents import (
     load_current_agent,
     save_current_agent,
     save_last_command,
+    VoiceAgentConfig,
+)
+from voice_agent.audio import (
+    get_error_sound,
+    get_success_chime,
+    preload_sounds,
+    prepend_notification,
 )
-from voice_agent.audio import get_error_sound, get_success_chime, prepend_notification
 from voice_agent.claude import ask_claude, clear_conversation, get_context_usage
 from voice_agent.commands import execute_command, undo_last
 from voice_agent.research import spawn_research
@@ -39,12 +47,20 @@ from voice_agent.transcribe import (
 from voice_agent.transcribe import (
     unload_model as unload_transcribe_model,
 )
+from voice_agent.transcribe import (
+    warm_model as warm_transcribe_model,
+)
 from voice_agent.tts import (
+    MARKDOWN_CHARS,
     get_audio_media_type,
     get_output_format,
+    preimport,
     synthesize,
     warm_model,
 )
+from voice_agent.tts import (
+    aclose as aclose_tts,
+)
 from voice_agent.tts import (
     unload_model as unload_tts_model,
 )
@@ -64,17 +80,40 @@ RESET_PHRASES = []
 # Phrases that trigger context usage check
 CONTEXT_PHRASES = []
 
+# Largest audio upload accepted by /voice (same as /api/chat/audio)
+MAX_AUDIO_BYTES = 25 * 1024 * 1024
+
 
-def is_reset_request(text: str) -> bool:
-    """Check if user is requesting a conversation reset."""
-    text_lower = text.lower().strip()
-    return any(phrase in text_lower for phrase in RESET_PHRASES)
+def _compile_special_phrases() -> re.Pattern[str] | None:
+    """Compile reset/context phrases into one pattern with a named group each."""
+    groups = [
+        f"(?P<{name}>{'|'.join(map(re.escape, phrases))})"
+        for name, phrases in (("reset", RESET_PHRASES), ("context", CONTEXT_PHRASES))
+        if phrases
+    ]
+    if not groups:
+        return None
+    return re.compile("|".join(groups), re.IGNORECASE)
 
 
-def is_context_request(text: str) -> bool:
-    """Check if user is requesting context usage info."""
-    text_lower = text.lower().strip()
-    return any(phrase in text_lower for phrase in CONTEXT_PHRASES)
+_SPECIAL_PHRASES_RE = _compile_special_phrases()
+
+
+def classify_special_request(text: str) -> str | None:
+    """
+    Check if user is requesting a conversation reset or context usage info.
+
+    Returns "reset", "context", or None. Reset wins if both are present.
+    """
+    if _SPECIAL_PHRASES_RE is None:
+        return None
+
+    found = None
+    for match in _SPECIAL_PHRASES_RE.finditer(text):
+        if match.lastgroup == "reset":
+            return "reset"
+        found = match.lastgroup
+    return found
 
 
 def is_fatal_error(error: Exception) -> bool:
@@ -133,7 +172,7 @@ ML_IDLE_TIMEOUT = 30 * 60  # 30 minutes in seconds
 
 
 def _cleanup_models() -> None:
-    """Synchronous cleanup for signal/atexit handlers."""
+    """Synchronous cleanup for the signal handler and lifespan shutdown."""
     global _cleanup_done
     if _cleanup_done:
         return
@@ -151,10 +190,12 @@ def _signal_handler(signum: int, frame: object) -> None:
     raise SystemExit(0)
 
 
-# Register cleanup handlers - these run even when uvicorn reloader kills the process
-atexit.register(_cleanup_models)
-signal.signal(signal.SIGTERM, _signal_handler)
-signal.signal(signal.SIGINT, _signal_handler)
+# Register cleanup handlers - these run even when uvicorn reloader kills the process.
+# Lifespan shutdown covers the normal path, so no atexit hook is needed, and
+# signal handlers can only be installed from the main thread.
+if threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, _signal_handler)
+    signal.signal(signal.SIGINT, _signal_handler)
 
 
 def _unload_if_idle() -> None:
@@ -180,6 +221,17 @@ def _mark_ml_used() -> None:
     _models_loaded = True
 
 
+async def _warm_transcribe() -> None:
+    """Load Whisper and run its first pass in the background at startup."""
+    try:
+        await asyncio.to_thread(warm_transcribe_model)
+    except Exception as e:
+        logger.warning(f"Whisper warmup failed: {e}")
+        return
+    # Let the idle checker unload it again if no requests arrive
+    _mark_ml_used()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     """Manage application lifespan - cleanup resources on shutdown."""
@@ -191,10 +243,24 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
             _unload_if_idle()
 
     idle_task = asyncio.create_task(idle_checker())
+    start_log_writer()
+    # Convert error sounds and chime up front so error paths skip ffmpeg
+    sounds_task = asyncio.create_task(
+        asyncio.to_thread(preload_sounds, get_output_format())
+    )
+    whisper_task = asyncio.create_task(_warm_transcribe())
+    # Overlap the slow TTS imports with startup instead of the first request
+    tts_import_task = asyncio.create_task(asyncio.to_thread(preimport))
     try:
         yield
     finally:
         idle_task.cancel()
+        sounds_task.cancel()
+        whisper_task.cancel()
+        tts_import_task.cancel()
+        # Flush any queued conversation log entries
+        await stop_log_writer()
+        await aclose_tts()
         # Shutdown: unload models (may already be done by signal handler)
         _cleanup_models()
 
@@ -236,8 +302,50 @@ def get_claude_project_hash(project_dir: Path) -> str:
     return str(project_dir.resolve()).replace("/", "-")
 
 
+# Claude Code's native conversation logs for this project (hash overridable
+# via CLAUDE_PROJECT_HASH, e.g. when the repo is checked out elsewhere)
+CLAUDE_PROJECT_HASH = os.getenv(
+    "CLAUDE_PROJECT_HASH", get_claude_project_hash(PROJECT_DIR)
+)
+CLAUDE_CONVERSATIONS_DIR = (
+    Path.home() / ".claude" / "projects" / CLAUDE_PROJECT_HASH / "conversations"
+)
+
+
+def build_agent_contexts(
+    config: VoiceAgentConfig,
+) -> dict[str | None, tuple[Path, Path, str | None]]:
+    """Precompute (cwd, conversations_dir, voice) for every configured agent.
+
+    The None key holds the default agent's context.
+    """
+    contexts: dict[str | None, tuple[Path, Path, str | None]] = {
+        None: (PROJECT_DIR, get_conversations_dir(None), None)
+    }
+    for name, agent_config in config.agents.items():
+        contexts[name] = (
+            agent_config.path,
+            get_conversations_dir(name),
+            agent_config.voice,
+        )
+    return contexts
+
+
+def get_agent_context(agent_name: str | None) -> tuple[Path, Path, str | None]:
+    """Get (cwd, conversations_dir, voice) for the given agent.
+
+    Agents missing from the config (e.g. removed since they were selected)
+    run in the project dir but keep their own conversation log.
+    """
+    context = AGENT_CONTEXTS.get(agent_name)
+    if context is None:
+        context = (PROJECT_DIR, get_conversations_dir(agent_name), None)
+    return context
+
+
 # Load configuration on startup
 CONFIG = load_agents_config()
+AGENT_CONTEXTS = build_agent_contexts(CONFIG)
 logger.info(f"Loaded {len(CONFIG.agents)} agents: {list(CONFIG.agents.keys())}")
 logger.info(f"Loaded {len(CONFIG.commands)} commands: {list(CONFIG.commands.keys())}")
 logger.info(f"Loaded {len(CONFIG.keywords)} keywords for Whisper")
@@ -246,6 +354,120 @@ logger.info(f"Loaded {len(CONFIG.keywords)} keywords for Whisper")
 set_hotwords(CONFIG)
 
 
+# Today's date string, cached until the next local midnight
+_today_str = ""
+_today_expires = 0.0
+
+
+def today_str() -> str:
+    """Get today's local date as YYYY-MM-DD without calling strftime per request."""
+    global _today_str, _today_expires
+    now = time.time()
+    if now >= _today_expires:
+        today = datetime.fromtimestamp(now)
+        _today_str = today.strftime("%Y-%m-%d")
+        midnight = datetime.combine(today.date() + timedelta(days=1), datetime.min.time())
+        _today_expires = midnight.timestamp()
+    return _today_str
+
+
+# Conversation log writes are queued and flushed off the event loop in batches
+LOG_FLUSH_INTERVAL = 0.25  # seconds to wait for more entries before writing
+LOG_BATCH_SIZE = 32
+# Created by start_log_writer, inside the running event loop
+_log_queue: asyncio.Queue[tuple[Path, str] | None] | None = None
+_log_writer_task: asyncio.Task | None = None
+# Directories already created, to skip repeat mkdir calls
+_log_dirs: set[Path] = set()
+
+
+def _ensure_log_dir(directory: Path) -> None:
+    """Create a log directory unless it was already created."""
+    if directory not in _log_dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+        _log_dirs.add(directory)
+
+
+def _append_log_entries(log_file: Path, entries: list[str]) -> None:
+    """Append entries to a log file in a single unbuffered write."""
+    data = "".join(entries).encode("utf-8")
+    _ensure_log_dir(log_file.parent)
+    try:
+        with open(log_file, "ab", buffering=0) as f:
+            f.write(data)
+    except FileNotFoundError:
+        # The directory was removed after it was created; make it again
+        _log_dirs.discard(log_file.parent)
+        _ensure_log_dir(log_file.parent)
+        with open(log_file, "ab", buffering=0) as f:
+            f.write(data)
+
+
+async def _flush_log_batch(batch: list[tuple[Path, str]]) -> None:
+    """Write a batch of queued entries, one write per log file."""
+    by_file: dict[Path, list[str]] = {}
+    for log_file, entry in batch:
+        by_file.setdefault(log_file, []).append(entry)
+
+    for log_file, entries in by_file.items():
+        try:
+            await asyncio.to_thread(_append_log_entries, log_file, entries)
+        except OSError as e:
+            logger.error(f"Failed to write conversation log {log_file}: {e}")
+            # Don't trust the cached directory on the next write
+            _log_dirs.discard(log_file.parent)
+
+
+async def _log_writer(queue: asyncio.Queue[tuple[Path, str] | None]) -> None:
+    """Drain the log queue until a None sentinel is received."""
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+
+        # Collect more entries for a short window so bursts share one write
+        batch = [item]
+        stop = False
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+
+        await _flush_log_batch(batch)
+        if stop:
+            return
+
+
+def start_log_writer() -> None:
+    """Start the background conversation log writer."""
+    global _log_queue, _log_writer_task
+    _log_queue = asyncio.Queue()
+    _log_writer_task = asyncio.create_task(_log_writer(_log_queue))
+
+
+async def stop_log_writer() -> None:
+    """Flush pending log entries and stop the background writer."""
+    global _log_writer_task
+    if _log_writer_task is None:
+        return
+
+    _log_queue.put_nowait(None)
+    try:
+        await _log_writer_task
+    except Exception as e:
+        logger.error(f"Conversation log writer failed: {e}")
+    _log_writer_task = None
+
+
 def log_conversation(
     user_text: str,
     assistant_text: str,
@@ -253,23 +475,54 @@ def log_conversation(
     conversations_dir: Path | None = None,
     source: str = "",
 ) -> None:
-    """Append conversation to today's log file."""
+    """Queue a conversation entry for today's log file."""
     if conversations_dir is None:
         conversations_dir = DEFAULT_CONVERSATIONS_DIR
 
-    conversations_dir.mkdir(parents=True, exist_ok=True)
-    today = datetime.now().strftime("%Y-%m-%d")
-    log_file = conversations_dir / f"{today}.md"
+    log_file = conversations_dir / f"{today_str()}.md"
 
-    timestamp = datetime.now().strftime("%H:%M")
+    timestamp = time.strftime("%H:%M")
     marker = f" [{source}]" if source else ""
     entry = f"\n## {timestamp}{marker}\n**Kevin:** {user_text}\n\n"
     if thinking_text:
         entry += f"**Agent thinking:** {thinking_text}\n\n"
     entry += f"**Agent:** {assistant_text}\n"
 
-    with open(log_file, "a") as f:
-        f.write(entry)
+    if _log_writer_task is None or _log_writer_task.done():
+        # No background writer running (e.g. outside the app lifespan)
+        _append_log_entries(log_file, [entry])
+        return
+
+    _log_queue.put_nowait((log_file, entry))
+
+
+def read_last_agent_response(log_file: Path) -> str | None:
+    """
+    Get the last agent response from a conversation log.
+
+    Only the tail of the file is read, and the result is cached until the log
+    changes, so back-to-back "repeat" commands don't re-read it.
+    """
+    return _conversation_log.last_agent_response(log_file)
+
+
+# Fire-and-forget tasks; the event loop only keeps weak references to tasks
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro: Coroutine[Any, Any, None]) -> asyncio.Task:
+    """Start a background task, holding a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _background_done(task: asyncio.Task) -> None:
+    """Drop a finished background task and log any error it raised."""
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task failed: {task.exception()!r}")
 
 
 @app.get("/health")
@@ -287,10 +540,18 @@ async def process_voice(request: Request) -> Response:
     Returns: Audio response in configured format (default: Opus/ogg)
     """
     _mark_ml_used()
-    content = await request.body()
-    logger.info(f"Received raw audio: {len(content)} bytes")
     audio_format = get_output_format()
 
+    # Read the body into a single growing buffer, rejecting oversized uploads
+    # as soon as they cross the limit instead of buffering them whole
+    content = bytearray()
+    async for chunk in request.stream():
+        content += chunk
+        if len(content) > MAX_AUDIO_BYTES:
+            logger.warning(f"Audio upload exceeds {MAX_AUDIO_BYTES} bytes")
+            raise HTTPException(status_code=413, detail="Audio too large")
+    logger.info(f"Received raw audio: {len(content)} bytes")
+
     if len(content) < 100:
         logger.warning("Audio too short")
         error_sound = get_error_sound("empty_transcription", audio_format)
@@ -298,25 +559,18 @@ async def process_voice(request: Request) -> Response:
             return Response(content=error_sound, media_type=get_audio_media_type())
         raise HTTPException(status_code=400, detail="No audio data received")
 
-    # Detect format from content or default to m4a
-    suffix = ".m4a"
-    if content[:4] == b"RIFF":
-        suffix = ".wav"
-    elif content[:3] == b"ID3" or content[:2] == b"\xff\xfb":
-        suffix = ".mp3"
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
+    # Detect format from content (None lets ffmpeg probe, e.g. m4a)
+    input_format = None
+    if content.startswith(b"RIFF"):
+        input_format = "wav"
+    elif content.startswith((b"ID3", b"\xff\xfb")):
+        input_format = "mp3"
 
     try:
         logger.info("Transcribing audio...")
-        user_text = transcribe(tmp_path)
+        user_text = transcribe(content, input_format)
         logger.info(f"Transcription: {user_text}")
 
-        # Start warming TTS model while Claude thinks
-        asyncio.create_task(warm_model())
-
         # Empty transcription - just play crickets, no TTS needed
         if not user_text.strip():
             logger.warning("Empty transcription")
@@ -344,14 +598,9 @@ async def process_voice(request: Request) -> Response:
                 logger.info(f"Switched to agent: {new_agent_name or 'default'}")
 
             # Get agent path and voice
-            if current_agent_name and current_agent_name in CONFIG.agents:
-                agent_config = CONFIG.agents[current_agent_name]
-                cwd = agent_config.path
-                agent_voice = agent_config.voice
-            else:
-                cwd = PROJECT_DIR
-                agent_voice = None
-            conversations_dir = get_conversations_dir(current_agent_name)
+            cwd, conversations_dir, agent_voice = get_agent_context(
+                current_agent_name
+            )
 
             # Handle commands
             if command_name:
@@ -387,28 +636,16 @@ async def process_voice(request: Request) -> Response:
 
                 elif command_name == "repeat":
                     # Find last agent response from conversation log
-                    today = datetime.now().strftime("%Y-%m-%d")
-                    log_file = conversations_dir / f"{today}.md"
-
-                    last_agent_response = None
-                    if log_file.exists():
-                        with open(log_file, "r") as f:
-                            content = f.read()
-                            # Find all "**Agent:**" entries
-                            matches = list(
-                                re.finditer(
-                                    r"\*\*Agent:\*\* (.+?)(?=\n## |\n\*\*Agent thinking:\*\*|\Z)",
-                                    content,
-                                    re.DOTALL,
-                                )
-                            )
-                            if matches:
-                                last_agent_response = matches[-1].group(1).strip()
+                    log_file = conversations_dir / f"{today_str()}.md"
+
+                    last_agent_response = read_last_agent_response(log_file)
 
                     if last_agent_response:
                         # Convert text to speech and return
                         audio_bytes = await synthesize(
-                            last_agent_response, voice=agent_voice
+                            last_agent_response,
+                            voice=agent_voice,
+                            strip_chars=MARKDOWN_CHARS,
                         )
                         audio_bytes = prepend_notification(audio_bytes, audio_format)
                         log_conversation(user_text, "[repeated]", "", conversations_dir)
@@ -464,8 +701,10 @@ async def process_voice(request: Request) -> Response:
                                 content=error_sound, media_type=get_audio_media_type()
                             )
 
-                    # Execute the command
-                    success = execute_command(command_name, message, cwd)
+                    # Execute the command (runs Claude, so keep it off the event loop)
+                    success = await asyncio.to_thread(
+                        execute_command, command_name, message, cwd
+                    )
 
                     if success and cmd_config and cmd_config.silent:
                         # Save for undo/repeat
@@ -495,23 +734,18 @@ async def process_voice(request: Request) -> Response:
                 user_text = message if message else user_text
 
         # Get active agent config for Claude
-        if current_agent_name and current_agent_name in CONFIG.agents:
-            agent_config = CONFIG.agents[current_agent_name]
-            cwd = agent_config.path
-            agent_voice = agent_config.voice  # Per-agent TTS voice
+        cwd, conversations_dir, agent_voice = get_agent_context(current_agent_name)
+        if current_agent_name in CONFIG.agents:
             logger.info(f"Using agent '{current_agent_name}' at {cwd}")
-        else:
-            cwd = PROJECT_DIR
-            agent_voice = None
-        conversations_dir = get_conversations_dir(current_agent_name)
 
         # Check for special commands (reset, context)
         thinking_text = ""
-        if is_reset_request(user_text):
+        special_request = classify_special_request(user_text)
+        if special_request == "reset":
             logger.info("Resetting conversation...")
             clear_conversation(conversations_dir)
             assistant_text = "Starting a new conversation."
-        elif is_context_request(user_text):
+        elif special_request == "context":
             logger.info("Checking context usage...")
             assistant_text = get_context_usage(conversations_dir)
         elif not user_text.strip():
@@ -519,8 +753,12 @@ async def process_voice(request: Request) -> Response:
             assistant_text = "I'm here. What would you like to discuss?"
         else:
             logger.info("Getting Claude response...")
+            # Warm TTS while Claude thinks - ask_claude runs in a thread so
+            # the warmup task actually gets to overlap with it
+            _spawn(warm_model())
             start_time = time.time()
-            assistant_text, thinking_text = ask_claude(
+            assistant_text, thinking_text = await asyncio.to_thread(
+                ask_claude,
                 user_text,
                 cwd=cwd,
                 conversations_dir=conversations_dir,
@@ -533,10 +771,9 @@ async def process_voice(request: Request) -> Response:
         logger.info("Synthesizing speech...")
         try:
             # Strip markdown formatting for spoken output
-            speech_text = re.sub(r"\*+", "", assistant_text)  # Remove asterisks
-            speech_text = re.sub(r"_+", "", speech_text)  # Remove underscores
-            speech_text = re.sub(r"`+", "", speech_text)  # Remove backticks
-            audio_bytes = await synthesize(speech_text, voice=agent_voice)
+            audio_bytes = await synthesize(
+                assistant_text, voice=agent_voice, strip_chars=MARKDOWN_CHARS
+            )
         except Exception as tts_error:
             # Log full traceback for debugging
             logger.exception(f"TTS failed: {tts_error}")
@@ -565,25 +802,14 @@ async def process_voice(request: Request) -> Response:
             return Response(content=error_sound, media_type=get_audio_media_type())
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        Path(tmp_path).unlink(missing_ok=True)
-
 
 @app.post("/transcribe")
 async def transcribe_only(file: UploadFile) -> dict[str, str]:
     """Debug endpoint: transcribe audio without Claude/TTS."""
     _mark_ml_used()
-    suffix = Path(file.filename or "audio.m4a").suffix
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
-
-    try:
-        text = transcribe(tmp_path)
-        return {"text": text}
-    finally:
-        Path(tmp_path).unlink(missing_ok=True)
+    content = await file.read()
+    text = transcribe(content)
+    return {"text": text}
 
 
 @app.post("/tts")
@@ -594,6 +820,11 @@ async def tts_only(text: str) -> Response:
     return Response(content=audio_bytes, media_type=get_audio_media_type())
 
 
+def _sse(event: str, data: dict) -> bytes:
+    """Format a server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest) -> StreamingResponse:
     """Stream Claude chat response via SSE."""
@@ -603,12 +834,7 @@ async def chat(request: ChatRequest) -> StreamingResponse:
     current_agent_name = load_current_agent()
 
     # Get agent config
-    if current_agent_name and current_agent_name in CONFIG.agents:
-        agent_config = CONFIG.agents[current_agent_name]
-        cwd = agent_config.path
-    else:
-        cwd = PROJECT_DIR
-    conversations_dir = get_conversations_dir(current_agent_name)
+    cwd, conversations_dir, _ = get_agent_context(current_agent_name)
 
     # Collect full response for logging
     full_response = []
@@ -626,10 +852,16 @@ async def chat(request: ChatRequest) -> StreamingResponse:
             ):
                 if event_type == "thinking":
                     full_thinking.append(content)
-                    yield f"event: {event_type}\ndata: {json.dumps({'content': content, 'conversation_id': conversation_id})}\n\n"
+                    yield _sse(
+                        event_type,
+                        {"content": content, "conversation_id": conversation_id},
+                    )
                 elif event_type == "text":
                     full_response.append(content)
-                    yield f"event: {event_type}\ndata: {json.dumps({'content': content, 'conversation_id': conversation_id})}\n\n"
+                    yield _sse(
+                        event_type,
+                        {"content": content, "conversation_id": conversation_id},
+                    )
                 elif event_type == "done":
                     final_conversation_id = conversation_id
                     # Log the complete conversation
@@ -640,10 +872,10 @@ async def chat(request: ChatRequest) -> StreamingResponse:
                         conversations_dir,
                         source="chat",
                     )
-                    yield f"event: done\ndata: {json.dumps({'conversation_id': conversation_id})}\n\n"
+                    yield _sse("done", {"conversation_id": conversation_id})
         except Exception as e:
             logger.exception(f"Error in chat stream: {e}")
-            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            yield _sse("error", {"error": str(e)})
 
     return StreamingResponse(
         generate_events(),
@@ -670,105 +902,92 @@ async def chat_audio(file: UploadFile) -> StreamingResponse:
 
     # Validate file size (max 25MB)
     content = await file.read()
-    if len(content) > 25 * 1024 * 1024:
+    if len(content) > MAX_AUDIO_BYTES:
         raise HTTPException(
             status_code=400,
             detail="File too large. Maximum size is 25MB.",
         )
 
-    # Save to temp file
-    tmp_path = None
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-            tmp.write(content)
-            tmp_path = Path(tmp.name)
-
-        # Transcribe audio
-        transcribed_text = transcribe(tmp_path)
-
-        # Check if transcription is empty
-        if not transcribed_text or not transcribed_text.strip():
-            async def error_event():
-                yield f"event: error\ndata: {json.dumps({'content': 'Could not transcribe audio - the recording may be silent or too short'})}\n\n"
-            return StreamingResponse(
-                error_event(),
-                media_type="text/event-stream",
-                headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    # Transcribe audio
+    transcribed_text = transcribe(content)
+
+    # Check if transcription is empty
+    if not transcribed_text or not transcribed_text.strip():
+        async def error_event():
+            yield _sse(
+                "error",
+                {
+                    "content": "Could not transcribe audio - the recording may be silent or too short"
+                },
             )
+        return StreamingResponse(
+            error_event(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+        )
 
-        # Load current agent
-        current_agent_name = load_current_agent()
+    # Load current agent
+    current_agent_name = load_current_agent()
 
-        # Get agent config
-        if current_agent_name and current_agent_name in CONFIG.agents:
-            agent_config = CONFIG.agents[current_agent_name]
-            cwd = agent_config.path
-        else:
-            cwd = PROJECT_DIR
-        conversations_dir = get_conversations_dir(current_agent_name)
+    # Get agent config
+    cwd, conversations_dir, _ = get_agent_context(current_agent_name)
 
-        # Collect full response for logging
-        full_response = []
-        full_thinking = []
+    # Collect full response for logging
+    full_response = []
+    full_thinking = []
 
-        async def generate_events():
-            """Generate SSE events from transcription and Claude stream."""
-            try:
-                # Send transcription event
-                yield f"event: transcription\ndata: {json.dumps({'content': transcribed_text})}\n\n"
-
-                # Stream Claude response
-                async for event_type, content, conversation_id in stream_claude(
-                    transcribed_text,
-                    cwd=cwd,
-                    conversations_dir=conversations_dir,
-                ):
-                    if event_type == "thinking":
-                        full_thinking.append(content)
-                        yield f"event: {event_type}\ndata: {json.dumps({'content': content, 'conversation_id': conversation_id})}\n\n"
-                    elif event_type == "text":
-                        full_response.append(content)
-                        yield f"event: {event_type}\ndata: {json.dumps({'content': content, 'conversation_id': conversation_id})}\n\n"
-                    elif event_type == "done":
-                        # Log the complete conversation
-                        log_conversation(
-                            transcribed_text,
-                            "\n".join(full_response),
-                            "\n".join(full_thinking),
-                            conversations_dir,
-                            source="audio",
-                        )
-                        yield f"event: done\ndata: {json.dumps({'conversation_id': conversation_id})}\n\n"
-            except Exception as e:
-                logger.exception(f"Error in audio chat stream: {e}")
-                yield f"event: error\ndata: {json.dumps({'content': str(e)})}\n\n"
+    async def generate_events():
+        """Generate SSE events from transcription and Claude stream."""
+        try:
+            # Send transcription event
+            yield _sse("transcription", {"content": transcribed_text})
 
-        return StreamingResponse(
-            generate_events(),
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
-    finally:
-        # Clean up temp file
-        if tmp_path:
-            tmp_path.unlink(missing_ok=True)
+            # Stream Claude response
+            async for event_type, content, conversation_id in stream_claude(
+                transcribed_text,
+                cwd=cwd,
+                conversations_dir=conversations_dir,
+            ):
+                if event_type == "thinking":
+                    full_thinking.append(content)
+                    yield _sse(
+                        event_type,
+                        {"content": content, "conversation_id": conversation_id},
+                    )
+                elif event_type == "text":
+                    full_response.append(content)
+                    yield _sse(
+                        event_type,
+                        {"content": content, "conversation_id": conversation_id},
+                    )
+                elif event_type == "done":
+                    # Log the complete conversation
+                    log_conversation(
+                        transcribed_text,
+                        "\n".join(full_response),
+                        "\n".join(full_thinking),
+                        conversations_dir,
+                        source="audio",
+                    )
+                    yield _sse("done", {"conversation_id": conversation_id})
+        except Exception as e:
+            logger.exception(f"Error in audio chat stream: {e}")
+            yield _sse("error", {"content": str(e)})
+
+    return StreamingResponse(
+        generate_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    )
 
 
 def get_preview_from_markdown(md_file: Path, max_length: int = 100) -> str:
-    """Extract last user message from markdown conversation log."""
-    if not md_file.exists():
-        return ""
-    try:
-        content = md_file.read_text()
-        # Find all user messages: **Kevin:** ...
-        matches = re.findall(
-            r"\*\*Kevin:\*\* (.+?)(?:\n\n|\n\*\*|$)", content, re.DOTALL
-        )
-        if matches:
-            return matches[-1].strip()[:max_length]
-    except OSError:
-        pass
-    return ""
+    """Extract last user message from markdown conversation log.
+
+    Reads only the tail of the file and is cached until the file changes.
+    """
+    message = _conversation_log.last_user_message(md_file)
+    return message[:max_length] if message else ""
 
 
 @app.get("/api/conversations")
@@ -776,26 +995,34 @@ async def get_conversations() -> list[dict[str, str]]:
     """Get list of conversations with IDs, dates, and previews."""
     # Load current agent
     current_agent_name = load_current_agent()
-    conversations_dir = get_conversations_dir(current_agent_name)
+    _, conversations_dir, _ = get_agent_context(current_agent_name)
 
     conversations = []
     if conversations_dir.exists():
         # List all markdown files matching date pattern (YYYY-MM-DD.md)
-        for md_file in conversations_dir.glob("????-??-??.md"):
+        md_files = list(conversations_dir.glob("????-??-??.md"))
+
+        # Read previews concurrently, off the event loop
+        previews = await asyncio.gather(
+            *(asyncio.to_thread(get_preview_from_markdown, md_file) for md_file in md_files)
+        )
+
+        # Session file maps today's date to the Claude conversation ID
+        session_data = {}
+        session_file = conversations_dir / ".claude-session.json"
+        if session_file.exists():
+            try:
+                session_data = json.loads(session_file.read_text())
+            except (json.JSONDecodeError, OSError):
+                pass
+
+        for md_file, preview in zip(md_files, previews):
             date = md_file.stem  # e.g., "2026-01-31"
-            preview = get_preview_from_markdown(md_file)
 
             # Use date as ID for historical conversations
-            # Check if there's a session file with Claude conversation ID
             conversation_id = date
-            session_file = conversations_dir / ".claude-session.json"
-            if session_file.exists():
-                try:
-                    data = json.loads(session_file.read_text())
-                    if data.get("date") == date:
-                        conversation_id = data.get("conversation_id", date)
-                except (json.JSONDecodeError, OSError):
-                    pass
+            if session_data.get("date") == date:
+                conversation_id = session_data.get("conversation_id", date)
 
             conversations.append(
                 {
@@ -811,6 +1038,36 @@ async def get_conversations() -> list[dict[str, str]]:
     return conversations
 
 
+# "## HH:MM ..." section headers in conversation logs (captures the time)
+_SECTION_HEADER_RE = re.compile(r"^## (\d{1,2}:\d{2}).*$", re.MULTILINE)
+
+
+def _split_sections(content: str) -> list[tuple[str | None, str]]:
+    """Split a conversation log into (timestamp, section) pairs.
+
+    Text before the first header is returned with a None timestamp.
+    """
+    parts = _SECTION_HEADER_RE.split(content)
+    sections: list[tuple[str | None, str]] = [(None, parts[0])]
+    sections.extend(zip(parts[1::2], parts[2::2]))
+    return sections
+
+
+def _extract_field(section: str, marker: str, end_marker: str) -> str | None:
+    """Return the text after the first marker, up to end_marker or section end.
+
+    Plain str.find slicing, so malformed logs can't trigger regex backtracking.
+    """
+    start = section.find(marker)
+    if start == -1:
+        return None
+    start += len(marker)
+    end = section.find(end_marker, start)
+    if end == -1:
+        end = len(section)
+    return section[start:end].strip()
+
+
 def parse_markdown_with_timestamps(md_file: Path) -> list[dict]:
     """Parse markdown conversation log into messages with timestamps."""
     messages = []
@@ -821,64 +1078,46 @@ def parse_markdown_with_timestamps(md_file: Path) -> list[dict]:
 
     try:
         content = md_file.read_text()
-        # Split by ## timestamp headers and capture the timestamp
-        parts = re.split(r"^## (\d{1,2}:\d{2}).*$", content, flags=re.MULTILINE)
-
-        # parts[0] is before first header, then alternating: timestamp, content
-        i = 1
-        while i < len(parts) - 1:
-            timestamp = parts[i]  # e.g., "14:30"
-            section = parts[i + 1]
-            i += 2
-
-            if not section.strip():
-                continue
-
-            # Create ISO timestamp for sorting
-            iso_timestamp = f"{date_str}T{timestamp}:00"
-
-            # Extract user message
-            user_match = re.search(
-                r"\*\*Kevin:\*\* (.+?)(?=\n\n\*\*Agent|\n\*\*Agent|\Z)",
-                section,
-                re.DOTALL,
-            )
-            if user_match:
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": user_match.group(1).strip(),
-                        "timestamp": timestamp,
-                        "iso_timestamp": iso_timestamp,
-                    }
-                )
+    except OSError:
+        return messages
 
-            # Extract thinking (optional)
-            thinking_text = ""
-            thinking_match = re.search(
-                r"\*\*Agent thinking:\*\* (.+?)(?=\n\n\*\*Agent:\*\*|\n\*\*Agent:\*\*|\Z)",
-                section,
-                re.DOTALL,
+    for timestamp, section in _split_sections(content):
+        # Only sections under a "## HH:MM" header carry a timestamp
+        if timestamp is None or not section.strip():
+            continue
+
+        # Create ISO timestamp for sorting
+        iso_timestamp = f"{date_str}T{timestamp}:00"
+
+        # Extract user message
+        user_text = _extract_field(section, "**Kevin:** ", "\n**Agent")
+        if user_text is not None:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": user_text,
+                    "timestamp": timestamp,
+                    "iso_timestamp": iso_timestamp,
+                }
             )
-            if thinking_match:
-                thinking_text = thinking_match.group(1).strip()
 
-            # Extract agent response
-            agent_match = re.search(
-                r"\*\*Agent:\*\* (.+?)(?=\n\n## |\n## |\Z)", section, re.DOTALL
+        # Extract thinking (optional)
+        thinking_text = (
+            _extract_field(section, "**Agent thinking:** ", "\n**Agent:**") or ""
+        )
+
+        # Extract agent response
+        agent_text = _extract_field(section, "**Agent:** ", "\n## ")
+        if agent_text is not None:
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": agent_text,
+                    "thinking": thinking_text,
+                    "timestamp": timestamp,
+                    "iso_timestamp": iso_timestamp,
+                }
             )
-            if agent_match:
-                messages.append(
-                    {
-                        "role": "assistant",
-                        "content": agent_match.group(1).strip(),
-                        "thinking": thinking_text,
-                        "timestamp": timestamp,
-                        "iso_timestamp": iso_timestamp,
-                    }
-                )
-    except OSError:
-        pass
 
     return messages
 
@@ -886,10 +1125,8 @@ def parse_markdown_with_timestamps(md_file: Path) -> list[dict]:
 @app.get("/api/conversations/recent")
 async def get_recent_messages(days: int = 3) -> dict[str, list]:
     """Get messages from the last N days merged together."""
-    from datetime import timedelta
-
     current_agent_name = load_current_agent()
-    conversations_dir = get_conversations_dir(current_agent_name)
+    _, conversations_dir, _ = get_agent_context(current_agent_name)
 
     all_messages = []
     today = datetime.now().date()
@@ -922,38 +1159,24 @@ def parse_markdown_conversation(md_file: Path) -> list[dict]:
 
     try:
         content = md_file.read_text()
-        # Split by ## timestamp headers
-        sections = re.split(r"^## \d{1,2}:\d{2}.*$", content, flags=re.MULTILINE)
-
-        for section in sections:
-            if not section.strip():
-                continue
-
-            # Extract user message
-            user_match = re.search(
-                r"\*\*Kevin:\*\* (.+?)(?=\n\n\*\*Agent|\n\*\*Agent|\Z)",
-                section,
-                re.DOTALL,
-            )
-            if user_match:
-                messages.append(
-                    {"role": "user", "content": user_match.group(1).strip()}
-                )
+    except OSError:
+        return messages
 
-            # Extract agent response
-            agent_match = re.search(
-                r"\*\*Agent:\*\* (.+?)(?=\n\n## |\n## |\Z)", section, re.DOTALL
+    for _, section in _split_sections(content):
+        if not section.strip():
+            continue
+
+        # Extract user message
+        user_text = _extract_field(section, "**Kevin:** ", "\n**Agent")
+        if user_text is not None:
+            messages.append({"role": "user", "content": user_text})
+
+        # Extract agent response
+        agent_text = _extract_field(section, "**Agent:** ", "\n## ")
+        if agent_text is not None:
+            messages.append(
+                {"role": "assistant", "content": agent_text, "thinking": ""}
             )
-            if agent_match:
-                messages.append(
-                    {
-                        "role": "assistant",
-                        "content": agent_match.group(1).strip(),
-                        "thinking": "",
-                    }
-                )
-    except OSError:
-        pass
 
     return messages
 
@@ -962,7 +1185,7 @@ def parse_markdown_conversation(md_file: Path) -> list[dict]:
 async def get_conversation(conversation_id: str) -> dict[str, str | list]:
     """Get full conversation by ID (date or UUID)."""
     current_agent_name = load_current_agent()
-    conversations_dir = get_conversations_dir(current_agent_name)
+    _, conversations_dir, _ = get_agent_context(current_agent_name)
 
     # Check if ID is a date (YYYY-MM-DD format)
     date_pattern = re.compile(r"^\d{4}-\d{2}-\d{2}$")
@@ -975,15 +1198,7 @@ async def get_conversation(conversation_id: str) -> dict[str, str | list]:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Otherwise try Claude's native JSONL format (for UUID-based IDs)
-    project_hash = get_claude_project_hash(PROJECT_DIR)
-    jsonl_file = (
-        Path.home()
-        / ".claude"
-        / "projects"
-        / project_hash
-        / "conversations"
-        / f"{conversation_id}.jsonl"
-    )
+    jsonl_file = CLAUDE_CONVERSATIONS_DIR / f"{conversation_id}.jsonl"
 
     if not jsonl_file.exists():
         # Try finding by date in session file
@@ -1003,13 +1218,13 @@ async def get_conversation(conversation_id: str) -> dict[str, str | list]:
 
     messages = []
     try:
-        with open(jsonl_file, "r") as f:
+        with open(jsonl_file, "rb") as f:
             for line in f:
                 line = line.strip()
                 if not line:
                     continue
                 try:
-                    msg = json.loads(line)
+                    msg = orjson.loads(line)
 
                     # Extract user messages
                     if msg.get("type") == "user" and msg.get("message"):
@@ -1052,7 +1267,7 @@ async def get_conversation(conversation_id: str) -> dict[str, str | list]:
                                 }
                             )
 
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     continue
 
     except OSError:
@@ -1094,9 +1309,10 @@ async def switch_agent(request: AgentSwitchRequest) -> dict[str, str]:
 @app.post("/reload-config")
 async def reload_config() -> dict:
     """Reload configuration from voice-agent-config.yaml."""
-    global CONFIG
+    global CONFIG, AGENT_CONTEXTS
     try:
         CONFIG = load_agents_config()
+        AGENT_CONTEXTS = build_agent_contexts(CONFIG)
         set_hotwords(CONFIG)
         return {
             "status": "ok",
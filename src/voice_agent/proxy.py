@@ -5,18 +5,24 @@ Proxies write operations (chat, voice) to PC.
 """
 
 import asyncio
-import json
+import functools
 import logging
 import os
 import re
 import subprocess
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator
 
 import httpx
+import orjson
 from fastapi import FastAPI, Request, HTTPException, Response
 from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 
+from voice_agent import _conversation_log
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -34,15 +40,47 @@ HEALTH_TIMEOUT = 5.0
 WOL_WAIT_TIMEOUT = 30.0
 REQUEST_TIMEOUT = 90.0
 
-app = FastAPI(title="Voice Agent Proxy")
+# Skip the health probe for this long after the PC was last seen up
+PC_UP_TTL = 10.0
+_pc_up_until = 0.0
+_pc_lock = asyncio.Lock()
+
+# Shared state created in lifespan (pooled HTTP client to the PC)
+app_state: dict = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Open one pooled HTTP client for all proxied requests, close on shutdown."""
+    client = httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30),
+    )
+    app_state["client"] = client
+    try:
+        yield
+    finally:
+        app_state.pop("client", None)
+        await client.aclose()
+
+
+app = FastAPI(title="Voice Agent Proxy", lifespan=lifespan)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson (cheaper on the Pi's CPU)."""
+
+    def render(self, content: object) -> bytes:
+        return orjson.dumps(content)
 
 
 async def check_pc_health() -> bool:
     """Check if PC is reachable."""
     try:
-        async with httpx.AsyncClient(timeout=HEALTH_TIMEOUT) as client:
-            resp = await client.get(f"{PC_BASE_URL}/health")
-            return resp.status_code == 200
+        resp = await app_state["client"].get(
+            f"{PC_BASE_URL}/health", timeout=HEALTH_TIMEOUT
+        )
+        return resp.status_code == 200
     except Exception:
         return False
 
@@ -65,12 +103,29 @@ async def wake_pc() -> bool:
 
 
 async def ensure_pc_available() -> None:
-    """Ensure PC is available, waking if necessary."""
-    if await check_pc_health():
+    """Ensure PC is available, waking if necessary.
+
+    A successful check is trusted for PC_UP_TTL seconds so back-to-back
+    requests don't each pay a health round trip.
+    """
+    global _pc_up_until
+    if time.monotonic() < _pc_up_until:
         return
 
-    if not await wake_pc():
-        raise HTTPException(status_code=503, detail="PC unavailable - wake failed")
+    async with _pc_lock:
+        # Another request may have checked while we waited for the lock
+        if time.monotonic() < _pc_up_until:
+            return
+
+        if not await check_pc_health() and not await wake_pc():
+            raise HTTPException(status_code=503, detail="PC unavailable - wake failed")
+        _pc_up_until = time.monotonic() + PC_UP_TTL
+
+
+def mark_pc_down() -> None:
+    """Forget the last successful health check so the next request re-probes."""
+    global _pc_up_until
+    _pc_up_until = 0.0
 
 
 async def simple_proxy(request: Request, path: str) -> Response:
@@ -78,32 +133,34 @@ async def simple_proxy(request: Request, path: str) -> Response:
     await ensure_pc_available()
 
     url = f"{PC_BASE_URL}/{path}"
-    try:
-        body = await request.body()
-        logger.info(f"Proxy read {len(body)} bytes from client for {path}")
-    except Exception as e:
-        logger.error(f"Failed to read request body: {type(e).__name__}: {e}")
-        raise
-
+    # Forward the body as it arrives rather than buffering the whole upload;
+    # content-length is kept so the PC can still enforce its size limit early
     headers = {
         k: v for k, v in request.headers.items()
-        if k.lower() not in ("host", "content-length")
+        if k.lower() != "host"
     }
 
-    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-        logger.info(f"Forwarding to {url}")
-        resp = await client.request(
+    has_body = "content-length" in headers or "transfer-encoding" in headers
+
+    logger.info(f"Forwarding to {url}")
+    try:
+        resp = await app_state["client"].request(
             request.method,
             url,
             headers=headers,
-            content=body if body else None,
-        )
-        logger.info(f"PC responded: {resp.status_code}, {len(resp.content)} bytes")
-        return Response(
-            content=resp.content,
-            status_code=resp.status_code,
-            media_type=resp.headers.get("content-type"),
+            content=request.stream() if has_body else None,
         )
+    except httpx.TransportError:
+        mark_pc_down()
+        raise
+    if resp.status_code >= 500:
+        mark_pc_down()
+    logger.info(f"PC responded: {resp.status_code}, {len(resp.content)} bytes")
+    return Response(
+        content=resp.content,
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type"),
+    )
 
 
 async def streaming_proxy(request: Request, path: str) -> StreamingResponse:
@@ -114,10 +171,12 @@ async def streaming_proxy(request: Request, path: str) -> StreamingResponse:
     body = await request.body()
     headers = {
         k: v for k, v in request.headers.items()
-        if k.lower() not in ("host", "content-length")
+        if k.lower() not in ("host", "content-length", "accept-encoding")
     }
+    # Bytes are passed through undecoded, so ask the PC not to compress them
+    headers["accept-encoding"] = "identity"
 
-    client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT)
+    client = app_state["client"]
 
     async def stream_response():
         try:
@@ -127,10 +186,13 @@ async def streaming_proxy(request: Request, path: str) -> StreamingResponse:
                 headers=headers,
                 content=body if body else None,
             ) as resp:
-                async for chunk in resp.aiter_bytes():
+                if resp.status_code >= 500:
+                    mark_pc_down()
+                async for chunk in resp.aiter_raw():
                     yield chunk
-        finally:
-            await client.aclose()
+        except httpx.TransportError:
+            mark_pc_down()
+            raise
 
     return StreamingResponse(
         stream_response(),
@@ -152,93 +214,162 @@ async def proxy_agents_switch(request: Request):
     return await simple_proxy(request, "api/agents/switch")
 
 
-def get_preview_from_markdown(md_file: Path, max_length: int = 100) -> str:
-    """Extract last user message from markdown conversation log."""
-    if not md_file.exists():
-        return ""
-    try:
-        content = md_file.read_text()
-        # Find all user messages: **Kevin:** ...
-        matches = re.findall(r"\*\*Kevin:\*\* (.+?)(?:\n\n|\n\*\*|$)", content, re.DOTALL)
-        if matches:
-            return matches[-1].strip()[:max_length]
-    except OSError:
-        pass
-    return ""
+# Conversation log markers (written by log_conversation in main.py)
+_USER_MARKER = "**Kevin:** "
+_AGENT_MARKER = "**Agent:** "
+_SECTION_RE = re.compile(r"## \d{1,2}:\d{2}")
+# Daily conversation log file names (YYYY-MM-DD.md)
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}\.md")
+
+
+def get_preview_from_markdown(
+    md_file: Path, max_length: int = 100, st: os.stat_result | None = None
+) -> str:
+    """Extract last user message from markdown conversation log.
+
+    Reads only the tail of the file and is cached until the file changes;
+    pass `st` if the file's stat is already known.
+    """
+    message = _conversation_log.last_user_message(md_file, st)
+    return message[:max_length] if message else ""
+
+
+def _emit_section(messages: list[dict], section: dict[str, str]) -> None:
+    """Append a section's user message then agent response, if present."""
+    for role in ("user", "assistant"):
+        if role in section:
+            messages.append({"role": role, "content": section[role]})
 
 
 def parse_markdown_conversation(md_file: Path) -> list[dict]:
-    """Parse markdown conversation log into messages."""
-    messages = []
-    if not md_file.exists():
-        return messages
+    """Parse markdown conversation log into messages.
 
+    Single pass over the lines: each "## H:MM" section yields its first user
+    message and first agent response, each ending at a blank line, the next
+    "**" marker or the next section.
+    """
+    messages: list[dict] = []
     try:
         content = md_file.read_text()
-        # Split by ## timestamp headers
-        sections = re.split(r"^## \d{1,2}:\d{2}", content, flags=re.MULTILINE)
+    except OSError:
+        return messages
 
-        for section in sections:
-            if not section.strip():
-                continue
+    section: dict[str, str] = {}
+    role = None
+    buf: list[str] = []
+    for line in content.splitlines():
+        is_header = _SECTION_RE.match(line) is not None
+        if role is not None and (not line or line.startswith("**") or is_header):
+            section.setdefault(role, "\n".join(buf).strip())
+            role = None
+
+        if is_header:
+            _emit_section(messages, section)
+            section = {}
+        elif role is not None:
+            buf.append(line)
+        elif line.startswith(_USER_MARKER) and "user" not in section:
+            role, buf = "user", [line[len(_USER_MARKER):]]
+        elif line.startswith(_AGENT_MARKER) and "assistant" not in section:
+            role, buf = "assistant", [line[len(_AGENT_MARKER):]]
+
+    if role is not None:
+        section.setdefault(role, "\n".join(buf).strip())
+    _emit_section(messages, section)
+
+    return messages
 
-            # Extract user message
-            user_match = re.search(r"\*\*Kevin:\*\* (.+?)(?:\n\n|\n\*\*|$)", section, re.DOTALL)
-            if user_match:
-                messages.append({"role": "user", "content": user_match.group(1).strip()})
 
-            # Extract agent response
-            agent_match = re.search(r"\*\*Agent:\*\* (.+?)(?:\n\n|\n\*\*|$)", section, re.DOTALL)
-            if agent_match:
-                messages.append({"role": "assistant", "content": agent_match.group(1).strip()})
+# Parse caches keyed by (path, st_mtime_ns, st_size): Syncthing rewrites
+# synced files, so an unchanged stat means the parsed result is still valid.
+@functools.lru_cache(maxsize=256)
+def _cached_messages(path: str, mtime_ns: int, size: int) -> list[dict]:
+    return parse_markdown_conversation(Path(path))
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_session(path: str, mtime_ns: int, size: int) -> dict:
+    try:
+        data = orjson.loads(Path(path).read_bytes())
+    except (orjson.JSONDecodeError, OSError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _stat_key(path: Path) -> tuple[str, int, int] | None:
+    """Cache key for a file's current version, or None if it can't be stat'd."""
+    try:
+        st = path.stat()
     except OSError:
-        pass
+        return None
+    return str(path), st.st_mtime_ns, st.st_size
 
-    return messages
 
+def load_messages(md_file: Path) -> list[dict]:
+    """Get parsed messages for a conversation log, parsing only when it changed."""
+    key = _stat_key(md_file)
+    return _cached_messages(*key) if key else []
 
-@app.get("/api/conversations")
-async def get_conversations():
-    """Serve conversations list from local synced folder."""
-    conversations = []
 
-    if not CONVERSATIONS_DIR.exists():
-        logger.warning(f"Conversations directory not found: {CONVERSATIONS_DIR}")
-        return JSONResponse(content=[])
+def load_session(session_file: Path) -> dict:
+    """Get a .claude-session.json's data ({} if missing or invalid)."""
+    key = _stat_key(session_file)
+    return _cached_session(*key) if key else {}
 
-    # Scan all agent subdirectories
-    for agent_dir in CONVERSATIONS_DIR.iterdir():
-        if not agent_dir.is_dir() or agent_dir.name.startswith('.'):
-            continue
 
-        agent_name = agent_dir.name
+def _scan_agent_dir(agent_dir: Path) -> list[dict]:
+    """List conversations in one agent's directory (blocking file I/O)."""
+    agent_name = agent_dir.name
+    session_data = load_session(agent_dir / ".claude-session.json")
 
-        # Look for markdown conversation files (YYYY-MM-DD.md pattern)
-        for md_file in agent_dir.glob("????-??-??.md"):
-            date = md_file.stem  # e.g., "2026-01-31"
-            preview = get_preview_from_markdown(md_file)
+    conversations = []
+    # Look for markdown conversation files (YYYY-MM-DD.md pattern); scandir
+    # entries carry the stat needed for the preview cache key
+    with os.scandir(agent_dir) as it:
+        for entry in it:
+            if not _DATE_RE.fullmatch(entry.name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            date = entry.name[:-3]  # e.g., "2026-01-31"
 
-            # Check for session file with Claude conversation ID
+            # Session file maps its date to the Claude conversation ID
             conversation_id = date
-            session_file = agent_dir / ".claude-session.json"
-            if session_file.exists():
-                try:
-                    data = json.loads(session_file.read_text())
-                    if data.get("date") == date:
-                        conversation_id = data.get("conversation_id", date)
-                except (json.JSONDecodeError, OSError):
-                    pass
+            if session_data.get("date") == date:
+                conversation_id = session_data.get("conversation_id", date)
 
             conversations.append({
                 "id": conversation_id,
                 "date": date,
-                "preview": preview,
+                "preview": get_preview_from_markdown(Path(entry.path), st=st),
                 "agent": agent_name,
             })
+    return conversations
+
+
+@app.get("/api/conversations")
+async def get_conversations():
+    """Serve conversations list from local synced folder."""
+    if not CONVERSATIONS_DIR.exists():
+        logger.warning(f"Conversations directory not found: {CONVERSATIONS_DIR}")
+        return ORJSONResponse(content=[])
+
+    # Scan all agent subdirectories concurrently, off the event loop
+    with os.scandir(CONVERSATIONS_DIR) as it:
+        agent_dirs = [
+            Path(entry.path) for entry in it
+            if entry.is_dir() and not entry.name.startswith('.')
+        ]
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_scan_agent_dir, d) for d in agent_dirs)
+    )
+    conversations = [c for agent_conversations in results for c in agent_conversations]
 
     # Sort by date descending
     conversations.sort(key=lambda x: x["date"], reverse=True)
-    return JSONResponse(content=conversations)
+    return ORJSONResponse(content=conversations)
 
 
 @app.get("/api/conversations/{conversation_id}")
@@ -255,32 +386,29 @@ async def get_conversation(conversation_id: str):
 
             # Find session file with matching conversation ID
             for session_file in agent_dir.glob("*.claude-session.json"):
-                try:
-                    data = json.loads(session_file.read_text())
-                    if data.get("conversation_id") == conversation_id:
-                        date = data.get("date")
-                        if date:
-                            md_file = agent_dir / f"{date}.md"
-                            messages = parse_markdown_conversation(md_file)
-                            if messages:
-                                return JSONResponse(content={
-                                    "id": conversation_id,
-                                    "messages": messages,
-                                })
-                except (json.JSONDecodeError, OSError):
-                    continue
+                data = load_session(session_file)
+                if data.get("conversation_id") == conversation_id:
+                    date = data.get("date")
+                    if date:
+                        messages = load_messages(agent_dir / f"{date}.md")
+                        if messages:
+                            return ORJSONResponse(content={
+                                "id": conversation_id,
+                                "messages": messages,
+                            })
 
     # Fallback: try proxying to PC
     logger.info(f"Conversation {conversation_id} not found locally, proxying to PC")
     try:
         if await check_pc_health():
-            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-                resp = await client.get(f"{PC_BASE_URL}/api/conversations/{conversation_id}")
-                return Response(
-                    content=resp.content,
-                    status_code=resp.status_code,
-                    media_type=resp.headers.get("content-type"),
-                )
+            resp = await app_state["client"].get(
+                f"{PC_BASE_URL}/api/conversations/{conversation_id}"
+            )
+            return Response(
+                content=resp.content,
+                status_code=resp.status_code,
+                media_type=resp.headers.get("content-type"),
+            )
     except Exception as e:
         logger.warning(f"Failed to proxy conversation request: {e}")
 
@@ -302,7 +430,8 @@ async def proxy_voice(request: Request):
         content_length = request.headers.get("content-length", "unknown")
         logger.info(f"Voice request received, content-length: {content_length}")
         result = await simple_proxy(request, "voice")
-        logger.info(f"Voice request completed, response size: {len(result.body) if result.body else 0}")
+        # Response size is already logged by simple_proxy
+        logger.info(f"Voice request completed: {result.status_code}")
         return result
     except Exception as e:
         logger.error(f"Voice proxy error: {type(e).__name__}: {e}")
@@ -2,6 +2,7 @@
 
 import logging
 import subprocess
+import tempfile
 from datetime import datetime
 from pathlib import Path
 
@@ -54,18 +55,20 @@ Requirements:
     logger.info(f"Spawning research subprocess for: {topic_slug}")
     logger.info(f"Output will be written to: {output_file}")
 
+    # Feed the prompt from an anonymous temp file rather than a pipe, so we
+    # never block waiting for Claude to drain stdin; it reads to EOF on its own
+    # and the file disappears once the child closes it.
     # start_new_session=True detaches from parent process group
-    # IMPORTANT: Must close stdin after writing so Claude sees EOF
-    proc = subprocess.Popen(
-        cmd,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        cwd=RESEARCH_TOOL_DIR,
-        start_new_session=True,
-        text=True
-    )
-    proc.stdin.write(prompt)
-    proc.stdin.close()
+    with tempfile.TemporaryFile() as prompt_file:
+        prompt_file.write(prompt.encode("utf-8"))
+        prompt_file.seek(0)
+        subprocess.Popen(
+            cmd,
+            stdin=prompt_file,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=RESEARCH_TOOL_DIR,
+            start_new_session=True,
+        )
 
     return output_file
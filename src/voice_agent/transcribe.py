@@ -1,16 +1,24 @@
 """Audio transcription using Whisper (OpenAI or faster-whisper)."""
 
+import functools
+import hashlib
 import os
 import logging
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
 
 if TYPE_CHECKING:
+    import numpy as np
     import whisper
     from faster_whisper import WhisperModel
 
+from voice_agent._torch import release_memory
 from voice_agent.agents import VoiceAgentConfig
 
 load_dotenv()
@@ -20,10 +28,22 @@ logger = logging.getLogger(__name__)
 # Lazy-loaded models
 _openai_model: "whisper.Whisper | None" = None
 _faster_model: "WhisperModel | None" = None
+# Serializes model loads, so a request arriving during the startup warmup
+# waits for that load instead of starting a second one
+_model_lock = threading.Lock()
 
 # Cached hotwords string
 _hotwords: str | None = None
 
+# Whisper models expect 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Recent transcripts keyed by a hash of the uploaded bytes, so a re-sent
+# upload (double tap, client retry) skips Whisper entirely
+TRANSCRIPT_CACHE_SIZE = 64
+_transcript_cache: OrderedDict[bytes, str] = OrderedDict()
+_transcript_cache_lock = threading.Lock()
+
 
 def build_hotwords_string(config: VoiceAgentConfig) -> str:
     """
@@ -31,22 +51,39 @@ def build_hotwords_string(config: VoiceAgentConfig) -> str:
 
     Includes: keywords, command names, aliases, agent names
     """
+    return _build_hotwords(
+        tuple(config.keywords),
+        tuple((cmd.name, tuple(cmd.aliases)) for cmd in config.commands.values()),
+        tuple(agent.name for agent in config.agents.values()),
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _build_hotwords(
+    keywords: tuple[str, ...],
+    commands: tuple[tuple[str, tuple[str, ...]], ...],
+    agent_names: tuple[str, ...],
+) -> str:
+    """Build the hotwords string from hashable config parts.
+
+    Cached so reloading an unchanged config doesn't rebuild and re-sort it.
+    """
     words: set[str] = set()
 
     # Add keywords
-    for kw in config.keywords:
+    for kw in keywords:
         # Split multi-word keywords
         words.update(kw.lower().split())
 
     # Add command names and aliases
-    for cmd in config.commands.values():
-        words.add(cmd.name.lower())
-        for alias in cmd.aliases:
+    for name, aliases in commands:
+        words.add(name.lower())
+        for alias in aliases:
             words.add(alias.lower())
 
     # Add agent names (split hyphenated)
-    for agent in config.agents.values():
-        for part in agent.name.replace("-", " ").split():
+    for agent_name in agent_names:
+        for part in agent_name.replace("-", " ").split():
             words.add(part.lower())
 
     return " ".join(sorted(words))
@@ -57,6 +94,9 @@ def set_hotwords(config: VoiceAgentConfig) -> None:
     global _hotwords
     _hotwords = build_hotwords_string(config)
     logger.info(f"Whisper hotwords: {_hotwords}")
+    # Hotwords affect the output, so earlier transcripts may no longer match
+    with _transcript_cache_lock:
+        _transcript_cache.clear()
 
 
 def get_hotwords() -> str | None:
@@ -71,6 +111,14 @@ def _get_openai_model() -> "whisper.Whisper":
     if _openai_model is not None:
         return _openai_model
 
+    with _model_lock:
+        if _openai_model is None:
+            _openai_model = _load_openai_model()
+    return _openai_model
+
+
+def _load_openai_model() -> "whisper.Whisper":
+    """Load the OpenAI Whisper model (called under _model_lock)."""
     import whisper
     import torch
 
@@ -79,12 +127,12 @@ def _get_openai_model() -> "whisper.Whisper":
 
     logger.info(f"Loading OpenAI Whisper model '{model_name}' on {device}...")
     try:
-        _openai_model = whisper.load_model(model_name, device=device)
+        model = whisper.load_model(model_name, device=device)
     except Exception as e:
         raise RuntimeError(f"Failed to load Whisper model '{model_name}': {e}") from e
     logger.info("OpenAI Whisper model loaded")
 
-    return _openai_model
+    return model
 
 
 def _get_faster_model() -> "WhisperModel":
@@ -94,105 +142,233 @@ def _get_faster_model() -> "WhisperModel":
     if _faster_model is not None:
         return _faster_model
 
+    with _model_lock:
+        if _faster_model is None:
+            _faster_model = _load_faster_model()
+    return _faster_model
+
+
+def _load_faster_model() -> "WhisperModel":
+    """Load the faster-whisper model (called under _model_lock)."""
     from faster_whisper import WhisperModel
 
     model_name = os.getenv("WHISPER_MODEL", "base.en")
     device = os.getenv("WHISPER_DEVICE", "cuda")
-    compute_type = os.getenv("WHISPER_COMPUTE_TYPE", "float16")
-
-    logger.info(f"Loading faster-whisper model '{model_name}' on {device}...")
+    # INT8 weights: ~2x less memory and faster matmuls; set float16 for accuracy
+    default_compute = "int8_float16" if device == "cuda" else "int8"
+    compute_type = os.getenv("WHISPER_COMPUTE_TYPE", default_compute)
+    # Persistent directory for the downloaded CTranslate2 model (HF cache if unset)
+    download_root = os.getenv("WHISPER_MODEL_DIR") or None
+
+    logger.info(
+        f"Loading faster-whisper model '{model_name}' on {device} ({compute_type})..."
+    )
     try:
-        _faster_model = WhisperModel(model_name, device=device, compute_type=compute_type)
+        model = WhisperModel(
+            model_name,
+            device=device,
+            compute_type=compute_type,
+            download_root=download_root,
+        )
     except Exception as e:
         raise RuntimeError(f"Failed to load faster-whisper model '{model_name}': {e}") from e
     logger.info("faster-whisper model loaded")
 
-    return _faster_model
+    return model
+
+
+def _run_ffmpeg_decode(input_args: list[str], data: bytes | None) -> bytes:
+    """Run ffmpeg to produce 16 kHz mono s16le PCM on stdout."""
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-hide_banner",
+            "-loglevel", "error",
+            *input_args,
+            "-f", "s16le",
+            "-ac", "1",
+            "-ar", str(SAMPLE_RATE),
+            "pipe:1",
+        ],
+        input=data,
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {result.stderr.decode()}")
+    return result.stdout
+
+
+def _is_mp4(data: bytes) -> bool:
+    """Whether data looks like an MP4/M4A file (ISO BMFF "ftyp" box first)."""
+    return data[4:8] == b"ftyp"
+
+
+def _decode_from_file(format_args: list[str], data: bytes) -> bytes:
+    """Decode via a temp file, for inputs ffmpeg can't read from a pipe."""
+    with tempfile.NamedTemporaryFile() as tmp:
+        tmp.write(data)
+        tmp.flush()
+        return _run_ffmpeg_decode([*format_args, "-i", tmp.name], None)
+
+
+def decode_audio(data: bytes, input_format: str | None = None) -> "np.ndarray":
+    """
+    Decode audio bytes to a 16 kHz mono float32 waveform.
 
+    Audio is piped through ffmpeg's stdin, so no temp file is needed. MP4/M4A
+    files may have their index at the end, which can't be read from a pipe;
+    those go straight to a temp file, as does anything the pipe fails on or
+    decodes to nothing.
 
-def _transcribe_openai(audio_path: str | Path) -> str:
+    Args:
+        data: Raw audio file bytes
+        input_format: Optional ffmpeg format hint (e.g., "wav", "mp3")
+
+    Raises:
+        RuntimeError: If ffmpeg fails or produces no audio.
+    """
+    import numpy as np
+
+    format_args = ["-f", input_format] if input_format else []
+    if _is_mp4(data):
+        pcm = _decode_from_file(format_args, data)
+    else:
+        try:
+            pcm = _run_ffmpeg_decode([*format_args, "-i", "pipe:0"], data)
+            if not pcm:
+                raise RuntimeError("no audio decoded")
+        except RuntimeError as e:
+            logger.info(f"Pipe decode failed, retrying from temp file: {e}")
+            pcm = _decode_from_file(format_args, data)
+
+    if not pcm:
+        raise RuntimeError("ffmpeg decode produced no audio")
+
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+def _model_input(audio: "str | Path | np.ndarray") -> "str | np.ndarray":
+    """Whisper accepts a path string or a waveform array."""
+    if isinstance(audio, Path):
+        return str(audio)
+    return audio
+
+
+def _transcribe_openai(audio: "str | Path | np.ndarray") -> str:
     """Transcribe using OpenAI Whisper."""
     model = _get_openai_model()
-    result = model.transcribe(str(audio_path), fp16=False)
+    result = model.transcribe(_model_input(audio), fp16=False)
     return result["text"].strip()
 
 
-def _transcribe_faster(audio_path: str | Path) -> str:
+def _transcribe_faster(audio: "str | Path | np.ndarray") -> str:
     """Transcribe using faster-whisper with hotwords."""
     model = _get_faster_model()
 
     # Use hotwords if available
     hotwords = get_hotwords()
     segments, _ = model.transcribe(
-        str(audio_path),
+        _model_input(audio),
         hotwords=hotwords,
     )
     return " ".join(seg.text for seg in segments).strip()
 
 
-def transcribe(audio_path: str | Path) -> str:
+def transcribe(audio: str | Path | bytes, input_format: str | None = None) -> str:
     """
-    Transcribe an audio file to text.
+    Transcribe audio to text.
 
     Uses TRANSCRIBE_PROVIDER env var to select backend:
     - 'local' or 'faster' (default): faster-whisper
     - 'openai': OpenAI Whisper
 
     Args:
-        audio_path: Path to the audio file (.m4a, .wav, .mp3, etc.)
+        audio: Path to an audio file (.m4a, .wav, .mp3, etc.) or raw file bytes
+        input_format: Optional ffmpeg format hint when passing bytes
 
     Returns:
         Transcribed text string.
     """
+    if not isinstance(audio, (bytes, bytearray)):
+        return _transcribe_audio(audio)
+
+    key = hashlib.blake2b(audio, digest_size=16).digest()
+    with _transcript_cache_lock:
+        cached = _transcript_cache.get(key)
+        if cached is not None:
+            _transcript_cache.move_to_end(key)
+    if cached is not None:
+        logger.info("Transcript cache hit")
+        return cached
+
+    text = _transcribe_audio(decode_audio(audio, input_format))
+
+    with _transcript_cache_lock:
+        _transcript_cache[key] = text
+        while len(_transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+            _transcript_cache.popitem(last=False)
+    return text
+
+
+def _transcribe_audio(audio: "str | Path | np.ndarray") -> str:
+    """Transcribe a file path or decoded waveform with the configured provider."""
     provider = os.getenv("TRANSCRIBE_PROVIDER", "local").lower()
 
     if provider == "openai":
-        return _transcribe_openai(audio_path)
+        return _transcribe_openai(audio)
 
     # Default: try faster-whisper, fall back to OpenAI
     try:
-        return _transcribe_faster(audio_path)
+        return _transcribe_faster(audio)
     except ImportError as e:
         logger.warning(f"faster-whisper not available: {e}. Falling back to OpenAI.")
-        return _transcribe_openai(audio_path)
+        return _transcribe_openai(audio)
 
 
 def warm_model() -> None:
-    """Pre-load the transcription model."""
+    """Pre-load the transcription model and run a short silent clip through it.
+
+    The first forward pass pays one-time CUDA setup costs; doing it here keeps
+    them out of the first real voice request.
+    """
+    import numpy as np
+
     provider = os.getenv("TRANSCRIBE_PROVIDER", "local").lower()
+    silent = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)
 
     if provider == "openai":
         _get_openai_model()
-        return
+        run = _transcribe_openai
+    else:
+        # Default: try faster-whisper, fall back to OpenAI
+        try:
+            _get_faster_model()
+            run = _transcribe_faster
+        except ImportError:
+            _get_openai_model()
+            run = _transcribe_openai
 
-    # Default: try faster-whisper, fall back to OpenAI
     try:
-        _get_faster_model()
-    except ImportError:
-        _get_openai_model()
+        run(silent)
+    except Exception as e:
+        logger.warning(f"Whisper warmup pass failed: {e}")
 
 
 def unload_model() -> None:
     """Unload transcription models to free resources."""
     global _openai_model, _faster_model
 
-    if _faster_model is not None:
-        logger.info("Unloading faster-whisper model...")
-        del _faster_model
-        _faster_model = None
-
-    if _openai_model is not None:
-        logger.info("Unloading OpenAI Whisper model...")
-        del _openai_model
-        _openai_model = None
+    # Wait for any in-progress load rather than racing it
+    with _model_lock:
+        if _faster_model is not None:
+            logger.info("Unloading faster-whisper model...")
+            del _faster_model
+            _faster_model = None
 
-    # Force garbage collection to release CUDA memory
-    import gc
-    gc.collect()
+        if _openai_model is not None:
+            logger.info("Unloading OpenAI Whisper model...")
+            del _openai_model
+            _openai_model = None
 
-    try:
-        import torch
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-    except ImportError:
-        pass
+    release_memory(full=True)
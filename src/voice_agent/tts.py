@@ -1,43 +1,46 @@
 """TTS router with lazy loading and fallback."""
 
+import asyncio
+import functools
+import importlib
 import logging
 import os
-import subprocess
 from typing import Callable, Awaitable
 
 from dotenv import load_dotenv
 
+from voice_agent._ffmpeg import encode
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
-def _convert_audio(audio_bytes: bytes, from_format: str, to_format: str) -> bytes:
+async def _convert_audio(audio_bytes: bytes, from_format: str, to_format: str) -> bytes:
     """Convert audio between formats using ffmpeg."""
     if from_format == to_format:
         return audio_bytes
 
     logger.info(f"Converting audio from {from_format} to {to_format}")
 
-    result = subprocess.run(
-        [
-            "ffmpeg",
-            "-f", from_format,
-            "-i", "pipe:0",
-            "-c:a", "libopus" if to_format == "ogg" else "libmp3lame",
-            "-b:a", "64k" if to_format == "ogg" else "128k",
-            "-f", to_format,
-            "pipe:1",
-        ],
-        input=audio_bytes,
-        capture_output=True,
-    )
-
-    if result.returncode != 0:
-        logger.error(f"Audio conversion failed: {result.stderr.decode()}")
+    try:
+        return await encode(
+            audio_bytes, input_fmt=from_format, output_fmt=to_format
+        )
+    except RuntimeError as e:
+        logger.error(f"Audio conversion failed: {e}")
         return audio_bytes  # Return original on failure
 
-    return result.stdout
+
+# Markdown formatting characters that shouldn't be spoken
+MARKDOWN_CHARS = "*_`"
+
+
+@functools.lru_cache(maxsize=8)
+def _strip_table(chars: str) -> dict[int, None]:
+    """Translation table that deletes the given characters."""
+    return str.maketrans("", "", chars)
+
 
 # Type for TTS synthesize functions
 SynthesizeFunc = Callable[..., Awaitable[bytes]]
@@ -47,15 +50,34 @@ _primary: SynthesizeFunc | None = None
 _fallback: SynthesizeFunc | None = None
 _initialized = False
 
+# Resolved once in _init_providers (environment doesn't change at runtime)
+_provider_name = ""
+_provider_format = "mp3"  # Native format of the primary provider
+_output_format = "ogg"
+
+# Warmup state - warm_model is idempotent and safe to call concurrently
+_warm_lock = asyncio.Lock()
+_warmed = False
+_warm_failed = False  # Don't retry a failing load on every call
+
+# Slow imports (torch and the model packages) for each local provider
+_PROVIDER_IMPORTS = {
+    "kokoro": ("kokoro",),
+    "chatterbox": ("torch", "chatterbox.tts"),
+}
+
 
 def _init_providers() -> None:
     """Initialize TTS providers based on config."""
     global _primary, _fallback, _initialized
+    global _provider_name, _provider_format, _output_format
 
     if _initialized:
         return
 
     provider_name = os.getenv("TTS_PROVIDER", "kokoro").lower()
+    _provider_name = provider_name
+    _output_format = os.getenv("AUDIO_OUTPUT_FORMAT", "ogg").lower()
     logger.info(f"Initializing TTS with primary provider: {provider_name}")
 
     # Set up primary provider
@@ -90,10 +112,15 @@ def _init_providers() -> None:
         _primary = _fallback
         _fallback = None
 
+    # Local providers encode Opus; the API returns MP3
+    _provider_format = "mp3" if _primary is tts_api.synthesize else "ogg"
+
     _initialized = True
 
 
-async def synthesize(text: str, voice: str | None = None) -> bytes:
+async def synthesize(
+    text: str, voice: str | None = None, strip_chars: str = ""
+) -> bytes:
     """
     Convert text to speech.
 
@@ -103,7 +130,12 @@ async def synthesize(text: str, voice: str | None = None) -> bytes:
     Args:
         text: Text to synthesize
         voice: Optional voice override (e.g., "bm_lewis"). Falls back to env var.
+        strip_chars: Characters to drop before speaking (e.g., MARKDOWN_CHARS)
     """
+    if strip_chars:
+        text = text.translate(_strip_table(strip_chars))
+
+    # The primary provider loads its model lazily on first use
     _init_providers()
 
     provider_format = _get_provider_format()
@@ -126,57 +158,78 @@ async def synthesize(text: str, voice: str | None = None) -> bytes:
             raise RuntimeError("No TTS provider available")
 
     # Convert to configured output format if needed
-    return _convert_audio(audio, provider_format, output_format)
+    return await _convert_audio(audio, provider_format, output_format)
 
 
 def get_output_format() -> str:
     """Get the configured output audio format."""
-    return os.getenv("AUDIO_OUTPUT_FORMAT", "ogg").lower()
+    _init_providers()
+    return _output_format
 
 
 def get_audio_media_type() -> str:
     """Get the MIME type for audio output."""
-    output_format = get_output_format()
-    return "audio/ogg" if output_format == "ogg" else "audio/mpeg"
+    return "audio/ogg" if get_output_format() == "ogg" else "audio/mpeg"
 
 
 def _get_provider_format() -> str:
     """Get the native format of the current TTS provider."""
-    provider_name = os.getenv("TTS_PROVIDER", "kokoro").lower()
-
-    if provider_name == "kokoro":
-        try:
-            import kokoro  # noqa: F401
-            return "ogg"
-        except ImportError:
-            pass
-    elif provider_name == "chatterbox":
-        try:
-            import chatterbox  # noqa: F401
-            return "ogg"
-        except ImportError:
-            pass
-
-    return "mp3"
+    _init_providers()
+    return _provider_format
 
 
 async def warm_model() -> None:
     """
     Pre-load TTS model without synthesizing.
 
-    Call this during Claude thinking to reduce latency.
+    Call this while Claude is thinking to reduce latency. Idempotent: once the
+    model is warm (or warmup has failed), or while another warmup is in
+    flight, calls are cheap.
     """
-    _init_providers()
+    global _warmed, _warm_failed
+
+    if _warmed or _warm_failed:
+        return
+
+    async with _warm_lock:
+        if _warmed or _warm_failed:
+            return
+        _init_providers()
+        try:
+            # Model load is blocking - keep it off the event loop
+            await asyncio.to_thread(_load_provider_model)
+        except Exception as e:
+            logger.warning(f"TTS warmup failed: {e}")
+            _warm_failed = True
+            return
+        _warmed = True
+
+
+def preimport() -> None:
+    """
+    Import the configured provider's heavy dependencies.
 
+    Blocking; run it in a thread at startup so the slow imports overlap
+    startup instead of the first request.
+    """
     provider_name = os.getenv("TTS_PROVIDER", "kokoro").lower()
-    if provider_name == "kokoro":
+    for module in _PROVIDER_IMPORTS.get(provider_name, ()):
+        try:
+            importlib.import_module(module)
+        except Exception:
+            return  # The real import when the model loads reports any problem
+
+
+def _load_provider_model() -> None:
+    """Load the configured local TTS model, if any."""
+    if _provider_name == "kokoro":
         try:
             from voice_agent import tts_kokoro
-            tts_kokoro.load_model()
+            tts_kokoro.warm_up()
             logger.info("TTS model warmed")
         except ImportError:
             pass  # Kokoro not installed, nothing to warm
-    elif provider_name == "chatterbox":
+    elif _provider_name == "chatterbox":
         try:
             from voice_agent import tts_chatterbox
             tts_chatterbox.load_model()
@@ -185,9 +238,15 @@ async def warm_model() -> None:
             pass  # Chatterbox not installed, nothing to warm
 
 
+async def aclose() -> None:
+    """Close network resources held by the API provider (call on shutdown)."""
+    from voice_agent import tts_api
+    await tts_api.aclose()
+
+
 def unload_model() -> None:
     """Unload TTS model to free resources on shutdown."""
-    global _primary, _fallback, _initialized
+    global _primary, _fallback, _initialized, _warmed, _warm_failed
 
     provider_name = os.getenv("TTS_PROVIDER", "kokoro").lower()
     if provider_name == "kokoro":
@@ -206,3 +265,5 @@ def unload_model() -> None:
     _primary = None
     _fallback = None
     _initialized = False
+    _warmed = False
+    _warm_failed = False
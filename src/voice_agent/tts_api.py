@@ -1,16 +1,70 @@
 """Text-to-speech using OpenAI API."""
 
+import asyncio
+import importlib.util
 import os
 import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
+OPENAI_TTS_URL = "https://api.openai.com/v1/audio/speech"
+
+# HTTP/2 lets concurrent calls share one connection; needs the h2 package,
+# otherwise the client stays on HTTP/1.1
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Shared client so repeated calls reuse the TCP/TLS connection
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Get or create the pooled HTTP client."""
+    global _client
+
+    if _client is None or _client.is_closed:
+        try:
+            _client = _new_client(http2=HTTP2)
+        except ImportError:
+            # h2 found but unusable (e.g. a broken install); stay on HTTP/1.1
+            _client = _new_client(http2=False)
+    return _client
+
+
+def _new_client(http2: bool) -> httpx.AsyncClient:
+    """Build the pooled client, optionally with HTTP/2."""
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        # Enough sockets for sentence-level TTS calls to run side by side
+        limits=httpx.Limits(
+            max_connections=32,
+            max_keepalive_connections=10,
+            keepalive_expiry=60,
+        ),
+    )
+
+
+# In-flight requests by (text, voice); identical concurrent calls share one
+_inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+
+async def aclose() -> None:
+    """Close the pooled HTTP client (call on shutdown)."""
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 async def synthesize(text: str) -> bytes:
     """
     Convert text to speech using OpenAI TTS.
 
+    Concurrent calls for the same text and voice share a single API
+    request (e.g. a retried sentence while the first is still in flight).
+
     Returns: MP3 audio bytes.
     Raises: RuntimeError if TTS fails.
     """
@@ -20,25 +74,43 @@ async def synthesize(text: str) -> bytes:
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY not set in .env")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/audio/speech",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "tts-1",
-                "input": text,
-                "voice": voice,
-                "response_format": "mp3",
-            },
-            timeout=30.0,
-        )
+    key = (text, voice)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_request(text, voice, api_key))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _forget(key, t))
+
+    # Shielded so one caller cancelling doesn't cancel the others' request
+    return await asyncio.shield(task)
 
-        if response.status_code != 200:
-            raise RuntimeError(
-                f"OpenAI TTS API error: {response.status_code} - {response.text}"
-            )
 
-        return response.content
+def _forget(key: tuple[str, str], task: asyncio.Task) -> None:
+    """Drop a finished request from the in-flight map."""
+    _inflight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # Mark retrieved in case every caller went away
+
+
+async def _request(text: str, voice: str, api_key: str) -> bytes:
+    """POST one speech request and return the MP3 bytes."""
+    response = await _get_client().post(
+        OPENAI_TTS_URL,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        json={
+            "model": "tts-1",
+            "input": text,
+            "voice": voice,
+            "response_format": "mp3",
+        },
+    )
+
+    if response.status_code != 200:
+        raise RuntimeError(
+            f"OpenAI TTS API error: {response.status_code} - {response.text}"
+        )
+
+    return response.content
@@ -1,67 +1,112 @@
 """Text-to-speech using Chatterbox (voice cloning)."""
 
-import io
+import asyncio
+import contextlib
 import os
 import logging
-import subprocess
+import threading
+from functools import lru_cache
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+from voice_agent._opus import encode_pcm
+from voice_agent._torch import release_memory
+
 if TYPE_CHECKING:
     from chatterbox.tts import ChatterboxTTS
 
 logger = logging.getLogger(__name__)
 
 _model: "ChatterboxTTS | None" = None
+# Serializes model loads, so a request arriving during the warmup waits for
+# that load instead of building a second model
+_model_lock = threading.Lock()
 
 # Project root for resolving relative voice paths
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
+# Reduced-precision autocast for generation on CUDA: "bf16", "fp16" or
+# "fp32" (off). bf16 needs Ampere or newer.
+AUTOCAST_DTYPE = os.getenv("CHATTERBOX_DTYPE", "fp32").lower()
+
+# cuDNN autotuning ("1" to enable). Off by default: it is process-wide and
+# re-tunes for every new input shape, and utterance lengths vary per request.
+CUDNN_BENCHMARK = os.getenv("CHATTERBOX_CUDNN_BENCHMARK", "0") == "1"
+
 
 def load_model() -> "ChatterboxTTS":
-    """Load the Chatterbox TTS model. Called once lazily."""
+    """Load the Chatterbox TTS model. Called once lazily.
+
+    Blocking; called from worker threads.
+    """
     global _model
 
     if _model is not None:
         return _model
 
+    with _model_lock:
+        if _model is None:
+            _model = _load_model()
+    return _model
+
+
+def _load_model() -> "ChatterboxTTS":
+    """Load and warm the Chatterbox TTS model (called under _model_lock)."""
     from chatterbox.tts import ChatterboxTTS
 
     device = os.getenv("CHATTERBOX_DEVICE", "cuda")
 
+    import torch
+
+    if CUDNN_BENCHMARK:
+        torch.backends.cudnn.benchmark = True
+
     logger.info(f"Loading Chatterbox TTS (device={device})...")
     try:
-        _model = ChatterboxTTS.from_pretrained(device=device)
+        model = ChatterboxTTS.from_pretrained(device=device)
     except Exception as e:
         raise RuntimeError(f"Failed to load Chatterbox TTS model: {e}") from e
     logger.info("Chatterbox TTS model loaded")
 
-    return _model
+    _warm_up(model)
+    return model
+
+
+def _warm_up(model: "ChatterboxTTS") -> None:
+    """
+    Run one short generation so the first real request is on the warm path.
+
+    The first call pays CUDA context setup, cuBLAS handle creation and
+    cuDNN autotuning; doing it at load time keeps that off user requests.
+    """
+    try:
+        _generate(model, "Hi.", _get_voice_path())
+    except Exception as e:
+        logger.warning(f"Chatterbox warmup generation failed: {e}")
+
+
+def _generate(model: "ChatterboxTTS", text: str, voice_path: Path):
+    """Run model.generate without autograd, under autocast if configured."""
+    import torch
 
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(torch.inference_mode())
 
-def _wav_to_opus(wav_bytes: bytes) -> bytes:
-    """Convert WAV bytes to Opus using ffmpeg."""
-    result = subprocess.run(
-        [
-            "ffmpeg",
-            "-i", "pipe:0",
-            "-c:a", "libopus",
-            "-b:a", "64k",
-            "-f", "ogg",
-            "pipe:1",
-        ],
-        input=wav_bytes,
-        capture_output=True,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode()}")
-    return result.stdout
+        dtype = {"bf16": torch.bfloat16, "fp16": torch.float16}.get(AUTOCAST_DTYPE)
+        if dtype is not None and str(getattr(model, "device", "")).startswith("cuda"):
+            stack.enter_context(torch.autocast("cuda", dtype=dtype))
+
+        return model.generate(text, audio_prompt_path=str(voice_path))
 
 
 def _get_voice_path() -> Path:
     """Get the path to the voice reference file."""
-    voice_path = os.getenv("CHATTERBOX_VOICE", "voices/theo.wav")
+    return _resolve_voice_path(os.getenv("CHATTERBOX_VOICE", "voices/theo.wav"))
+
 
+@lru_cache(maxsize=8)
+def _resolve_voice_path(voice_path: str) -> Path:
+    """Resolve and check a voice reference path. Cached per env value."""
     path = Path(voice_path)
     if not path.is_absolute():
         path = PROJECT_ROOT / voice_path
@@ -76,20 +121,14 @@ def unload_model() -> None:
     """Unload Chatterbox TTS model to free resources."""
     global _model
 
-    if _model is not None:
+    # Wait for any in-progress load rather than racing it
+    with _model_lock:
+        if _model is None:
+            return
         logger.info("Unloading Chatterbox TTS model...")
         del _model
         _model = None
-
-        import gc
-        gc.collect()
-
-        try:
-            import torch
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-        except ImportError:
-            pass
+    release_memory(full=True)
 
 
 async def synthesize(text: str) -> bytes:
@@ -98,23 +137,21 @@ async def synthesize(text: str) -> bytes:
 
     Returns: Opus audio bytes (in Ogg container).
     """
-    import torchaudio
-
-    model = load_model()
+    # May wait on a load already in flight (e.g. the warmup); off the event loop
+    model = await asyncio.to_thread(load_model)
     voice_path = _get_voice_path()
 
     logger.info(f"Generating speech with voice: {voice_path.name}")
 
     # Generate audio with voice cloning
-    wav_tensor = model.generate(
-        text,
-        audio_prompt_path=str(voice_path),
-    )
-
-    # Convert tensor to WAV bytes
-    wav_buffer = io.BytesIO()
-    torchaudio.save(wav_buffer, wav_tensor, model.sr, format="wav")
-    wav_bytes = wav_buffer.getvalue()
-
-    # Convert WAV to Opus
-    return _wav_to_opus(wav_bytes)
+    wav_tensor = _generate(model, text, voice_path)
+
+    # Feed raw float32 PCM straight to the encoder (no WAV wrapper); the
+    # .float() also undoes any autocast dtype.
+    # The tensor is (channels, samples); the encoder wants interleaved samples.
+    wav = wav_tensor.detach().float().cpu()
+    if wav.dim() == 1:
+        wav = wav.unsqueeze(0)
+    channels = wav.shape[0]
+    pcm = wav.t().contiguous().numpy().tobytes()
+    return await encode_pcm(pcm, sample_rate=model.sr, channels=channels)
@@ -1,100 +1,185 @@
 """Text-to-speech using Kokoro."""
 
-import io
+import asyncio
 import os
 import logging
-import subprocess
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from functools import lru_cache
 from typing import TYPE_CHECKING
 
+import numpy as np
+
+from voice_agent._opus import encode_pcm_stream
+from voice_agent._torch import release_memory
+
 if TYPE_CHECKING:
     from kokoro import KPipeline
 
 logger = logging.getLogger(__name__)
 
-_pipelines: dict[str, "KPipeline"] = {}
+# Loaded pipelines by lang_code, least recently used first
+_pipelines: OrderedDict[str, "KPipeline"] = OrderedDict()
+
+# Most pipelines kept resident; switching between voices of different
+# languages beyond this evicts the least recently used one
+MAX_PIPELINES = int(os.getenv("KOKORO_MAX_PIPELINES", "2"))
+
+# Kokoro outputs 24 kHz mono float audio
+SAMPLE_RATE = 24000
+
+# Serializes pipeline loads, so a request arriving during the warmup waits
+# for that load instead of building a second pipeline
+_load_lock = threading.Lock()
+
+# Inference runs in worker threads; one at a time, as when it ran inline
+_inference_lock = threading.Lock()
+
+# End-of-audio marker from the inference thread
+_DONE = object()
+
+# Voice name prefix -> Kokoro lang_code
+_LANG_MAP: dict[str, str] = {
+    "af": "a",  # American female
+    "am": "a",  # American male
+    "bf": "b",  # British female
+    "bm": "b",  # British male
+    "ef": "a",  # English (defaults to American)
+    "em": "a",
+    "jf": "j",  # Japanese
+    "jm": "j",
+    "zf": "z",  # Chinese
+    "zm": "z",
+    "ff": "f",  # French
+    "hf": "h",  # Hindi
+    "hm": "h",
+    "if": "h",  # Indian (uses Hindi model)
+    "im": "h",
+    "pf": "p",  # Portuguese
+    "pm": "p",
+}
 
 
 def _get_lang_code_for_voice(voice: str) -> str:
     """Determine Kokoro lang_code from voice prefix."""
-    prefix = voice[:2] if len(voice) >= 2 else "af"
-    lang_map = {
-        "af": "a",  # American female
-        "am": "a",  # American male
-        "bf": "b",  # British female
-        "bm": "b",  # British male
-        "ef": "a",  # English (defaults to American)
-        "em": "a",
-        "jf": "j",  # Japanese
-        "jm": "j",
-        "zf": "z",  # Chinese
-        "zm": "z",
-        "ff": "f",  # French
-        "hf": "h",  # Hindi
-        "hm": "h",
-        "if": "h",  # Indian (uses Hindi model)
-        "im": "h",
-        "pf": "p",  # Portuguese
-        "pm": "p",
-    }
-    return lang_map.get(prefix, "a")
+    return _LANG_MAP.get(voice[:2], "a")
+
+
+@lru_cache(maxsize=8)
+def _parse_speed(value: str) -> float:
+    """Parse the KOKORO_SPEED env value. Cached per env value."""
+    return float(value)
 
 
 def load_model(lang_code: str = "a") -> "KPipeline":
-    """Load the Kokoro TTS pipeline for a given lang_code. Cached per lang_code."""
-    global _pipelines
+    """Load the Kokoro TTS pipeline for a given lang_code. Cached per lang_code (LRU).
+
+    Blocking; called from worker threads.
+    """
+    with _load_lock:
+        if lang_code in _pipelines:
+            _pipelines.move_to_end(lang_code)
+            return _pipelines[lang_code]
+
+        pipeline = _load_pipeline(lang_code)
+
+        _pipelines[lang_code] = pipeline
+        while len(_pipelines) > max(MAX_PIPELINES, 1):
+            evicted, _ = _pipelines.popitem(last=False)
+            logger.info(f"Evicted Kokoro TTS pipeline (lang={evicted})")
+            release_memory()
 
-    if lang_code in _pipelines:
-        return _pipelines[lang_code]
+    return pipeline
 
+
+def _load_pipeline(lang_code: str) -> "KPipeline":
+    """Build a Kokoro pipeline (called under _load_lock)."""
     from kokoro import KPipeline
 
     logger.info(f"Loading Kokoro TTS (lang={lang_code})...")
     try:
-        _pipelines[lang_code] = KPipeline(lang_code=lang_code, repo_id="hexgrad/Kokoro-82M")
+        pipeline = KPipeline(lang_code=lang_code, repo_id="hexgrad/Kokoro-82M")
     except Exception as e:
         raise RuntimeError(f"Failed to load Kokoro TTS model: {e}") from e
     logger.info(f"Kokoro TTS model loaded (lang={lang_code})")
+    return pipeline
 
-    return _pipelines[lang_code]
-
-
-def _wav_to_opus(wav_bytes: bytes) -> bytes:
-    """Convert WAV bytes to Opus using ffmpeg."""
-    result = subprocess.run(
-        [
-            "ffmpeg",
-            "-i", "pipe:0",
-            "-c:a", "libopus",
-            "-b:a", "64k",
-            "-f", "ogg",
-            "pipe:1",
-        ],
-        input=wav_bytes,
-        capture_output=True,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode()}")
-    return result.stdout
+
+def warm_up() -> None:
+    """
+    Load the default voice's pipeline and run one short inference.
+
+    The first forward pass pays lazy-init costs (G2P lexicon, voice tensor
+    download, CUDA kernels). Running it here, with no encoding, keeps those
+    costs off the first real request.
+    """
+    voice = os.getenv("KOKORO_VOICE", "af_heart")
+    pipeline = load_model(_get_lang_code_for_voice(voice))
+    try:
+        with _inference_lock:
+            for _ in pipeline("Hi.", voice=voice):
+                pass
+    except Exception as e:
+        logger.warning(f"Kokoro warmup inference failed: {e}")
 
 
-def unload_model() -> None:
-    """Unload all Kokoro TTS models to free resources."""
-    global _pipelines
+def unload_model(lang_code: str | None = None) -> None:
+    """
+    Unload Kokoro TTS pipelines to free resources.
 
-    if _pipelines:
-        logger.info(f"Unloading Kokoro TTS models ({len(_pipelines)} pipelines)...")
-        _pipelines.clear()
+    Args:
+        lang_code: Unload only this pipeline. None unloads all of them.
+    """
+    # Wait for any in-progress load rather than racing it
+    with _load_lock:
+        if lang_code is not None:
+            if _pipelines.pop(lang_code, None) is not None:
+                logger.info(f"Unloaded Kokoro TTS pipeline (lang={lang_code})")
+                release_memory()
+            return
+
+        if _pipelines:
+            logger.info(f"Unloading Kokoro TTS models ({len(_pipelines)} pipelines)...")
+            _pipelines.clear()
+            release_memory(full=True)
+
+
+async def _generate_pcm(
+    pipeline: "KPipeline", text: str, voice: str, speed: float
+) -> AsyncIterator[bytes]:
+    """
+    Run Kokoro inference in a worker thread, yielding each segment's PCM.
 
-        # Force garbage collection to release CUDA/PyTorch memory
-        import gc
-        gc.collect()
+    Segments are handed back as soon as Kokoro produces them, so the caller
+    can encode one while the next is still being generated.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
 
+    def run() -> None:
         try:
-            import torch
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-        except ImportError:
-            pass
+            with _inference_lock:
+                for _, _, audio in pipeline(text, voice=voice, speed=speed):
+                    if stop.is_set():
+                        break
+                    pcm = np.ascontiguousarray(audio, dtype=np.float32).tobytes()
+                    loop.call_soon_threadsafe(queue.put_nowait, pcm)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        else:
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    loop.run_in_executor(None, run)
+    try:
+        while (item := await queue.get()) is not _DONE:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Stop generating if the consumer bailed out early
+        stop.set()
 
 
 async def synthesize(text: str, voice: str | None = None) -> bytes:
@@ -107,32 +192,19 @@ async def synthesize(text: str, voice: str | None = None) -> bytes:
 
     Returns: Opus audio bytes (in Ogg container).
     """
-    import numpy as np
-    import soundfile as sf
-
     voice = voice or os.getenv("KOKORO_VOICE", "af_heart")
     lang_code = _get_lang_code_for_voice(voice)
-    pipeline = load_model(lang_code)
-    speed = float(os.getenv("KOKORO_SPEED", "1.0"))
-
-    # Generate audio segments
-    generator = pipeline(text, voice=voice, speed=speed)
-
-    # Collect all audio segments
-    audio_segments: list[bytes] = []
-    for _, _, audio in generator:
-        audio_segments.append(audio)
-
-    # Concatenate audio arrays
-    if not audio_segments:
+    # May wait on a load already in flight (e.g. the warmup); off the event loop
+    pipeline = await asyncio.to_thread(load_model, lang_code)
+    speed = _parse_speed(os.getenv("KOKORO_SPEED", "1.0"))
+
+    # Encode each segment's raw PCM (no WAV wrapper) while Kokoro is still
+    # generating the next one
+    audio = await encode_pcm_stream(
+        _generate_pcm(pipeline, text, voice, speed),
+        sample_rate=SAMPLE_RATE,
+        channels=1,
+    )
+    if not audio:
         raise RuntimeError("Kokoro generated no audio")
-
-    full_audio = np.concatenate(audio_segments)
-
-    # Convert to WAV bytes
-    wav_buffer = io.BytesIO()
-    sf.write(wav_buffer, full_audio, 24000, format="WAV")
-    wav_bytes = wav_buffer.getvalue()
-
-    # Convert WAV to Opus
-    return _wav_to_opus(wav_bytes)
+    return audio
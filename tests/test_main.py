@@ -0,0 +1,294 @@
+"""Tests for the voice agent server's conversation log handling."""
+
+import asyncio
+import shutil
+from pathlib import Path
+
+import pytest
+
+from voice_agent import _conversation_log, main
+from voice_agent.agents import (
+    CommandConfig,
+    VoiceAgentConfig,
+    extract_keywords_from_window,
+)
+from voice_agent.main import (
+    classify_special_request,
+    get_preview_from_markdown,
+    parse_markdown_conversation,
+    parse_markdown_with_timestamps,
+    read_last_agent_response,
+)
+
+@pytest.fixture
+def special_phrases(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Configure reset/context phrases and recompile the classifier pattern."""
+    monkeypatch.setattr(main, "RESET_PHRASES", ["new conversation", "start over"])
+    monkeypatch.setattr(main, "CONTEXT_PHRASES", ["context usage", "how much context"])
+    monkeypatch.setattr(main, "_SPECIAL_PHRASES_RE", main._compile_special_phrases())
+
+
+@pytest.mark.usefixtures("special_phrases")
+class TestClassifySpecialRequest:
+    """Test detecting reset and context requests in a transcript."""
+
+    @pytest.mark.parametrize(
+        "text", ["Start a new conversation", "let's START OVER please"]
+    )
+    def test_reset(self, text: str) -> None:
+        """Reset phrases match anywhere in the text, ignoring case."""
+        assert classify_special_request(text) == "reset"
+
+    @pytest.mark.parametrize("text", ["What's my context usage?", "How much context is left"])
+    def test_context(self, text: str) -> None:
+        """Context phrases are classified as context requests."""
+        assert classify_special_request(text) == "context"
+
+    @pytest.mark.parametrize(
+        "text",
+        ["check context usage then start over", "start over and show context usage"],
+    )
+    def test_reset_wins_over_context(self, text: str) -> None:
+        """Reset wins regardless of which phrase comes first."""
+        assert classify_special_request(text) == "reset"
+
+    @pytest.mark.parametrize(
+        "text", ["What's on my calendar today?", "", "over the start line"]
+    )
+    def test_plain_message(self, text: str) -> None:
+        """Ordinary messages are not special requests."""
+        assert classify_special_request(text) is None
+
+    @pytest.mark.parametrize("text", ["repeat", "agent again", "replay that"])
+    def test_repeat_is_a_command_not_a_special_request(self, text: str) -> None:
+        """Repeat and its aliases are routed as commands, not classified here."""
+        config = VoiceAgentConfig(
+            commands={"repeat": CommandConfig(name="repeat", aliases=["again", "replay"])}
+        )
+        assert extract_keywords_from_window(text, config)["command"] == "repeat"
+        assert classify_special_request(text) is None
+
+    def test_no_phrases_configured(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Without any phrases nothing is classified."""
+        monkeypatch.setattr(main, "RESET_PHRASES", [])
+        monkeypatch.setattr(main, "CONTEXT_PHRASES", [])
+        monkeypatch.setattr(main, "_SPECIAL_PHRASES_RE", main._compile_special_phrases())
+        assert classify_special_request("start over") is None
+
+
+# A daily log as written by log_conversation: a stray entry before any
+# header, a multi-line exchange with thinking, and a malformed header
+# ("##9:20", no space) that folds into the previous section.
+CONVERSATION_LOG = """\
+**Kevin:** before any header
+
+**Agent:** ignored by the timestamped parser
+
+## 9:05
+**Kevin:** What's on my calendar today?
+
+**Agent:** You have a standup at 10
+and lunch with Sam at noon.
+
+## 9:12 [text]
+**Kevin:** Remind me
+to call the dentist
+
+**Agent thinking:** The user wants a reminder.
+
+**Agent:** Done. I'll remind you at 3pm.
+##9:20
+**Kevin:** not a real section
+"""
+
+
+def write_log(tmp_path: Path, content: str) -> Path:
+    """Write a log under a YYYY-MM-DD.md name, as the server does."""
+    path = tmp_path / "2026-01-31.md"
+    path.write_text(content)
+    return path
+
+
+class TestParseMarkdownWithTimestamps:
+    """Test parsing a daily log into timestamped chat messages."""
+
+    def test_parses_sample_log(self, tmp_path: Path) -> None:
+        """Header sections yield user and agent messages with timestamps."""
+        messages = parse_markdown_with_timestamps(write_log(tmp_path, CONVERSATION_LOG))
+        assert messages == [
+            {
+                "role": "user",
+                "content": "What's on my calendar today?",
+                "timestamp": "9:05",
+                "iso_timestamp": "2026-01-31T9:05:00",
+            },
+            {
+                "role": "assistant",
+                "content": "You have a standup at 10\nand lunch with Sam at noon.",
+                "thinking": "",
+                "timestamp": "9:05",
+                "iso_timestamp": "2026-01-31T9:05:00",
+            },
+            {
+                "role": "user",
+                "content": "Remind me\nto call the dentist",
+                "timestamp": "9:12",
+                "iso_timestamp": "2026-01-31T9:12:00",
+            },
+            {
+                "role": "assistant",
+                "content": (
+                    "Done. I'll remind you at 3pm.\n##9:20\n**Kevin:** not a real section"
+                ),
+                "thinking": "The user wants a reminder.",
+                "timestamp": "9:12",
+                "iso_timestamp": "2026-01-31T9:12:00",
+            },
+        ]
+
+    def test_empty_user_message_before_agent(self, tmp_path: Path) -> None:
+        """An empty user message stays empty instead of swallowing the reply."""
+        path = write_log(tmp_path, "\n## 9:00\n**Kevin:** \n**Agent:** hi\n")
+        assert [m["content"] for m in parse_markdown_with_timestamps(path)] == ["", "hi"]
+
+    def test_empty_agent_message_at_end_of_file(self, tmp_path: Path) -> None:
+        """A bare agent marker at end of file gives an empty reply."""
+        path = write_log(tmp_path, "\n## 9:00\n**Kevin:** hello\n\n**Agent:** ")
+        messages = parse_markdown_with_timestamps(path)
+        assert [(m["role"], m["content"]) for m in messages] == [
+            ("user", "hello"),
+            ("assistant", ""),
+        ]
+
+    def test_missing_file(self, tmp_path: Path) -> None:
+        """A missing log parses to no messages."""
+        assert parse_markdown_with_timestamps(tmp_path / "missing.md") == []
+
+
+class TestParseMarkdownConversation:
+    """Test parsing a daily log without timestamps."""
+
+    def test_parses_sample_log(self, tmp_path: Path) -> None:
+        """Text before the first header is included; thinking is not."""
+        messages = parse_markdown_conversation(write_log(tmp_path, CONVERSATION_LOG))
+        assert [(m["role"], m["content"]) for m in messages] == [
+            ("user", "before any header"),
+            ("assistant", "ignored by the timestamped parser"),
+            ("user", "What's on my calendar today?"),
+            ("assistant", "You have a standup at 10\nand lunch with Sam at noon."),
+            ("user", "Remind me\nto call the dentist"),
+            (
+                "assistant",
+                "Done. I'll remind you at 3pm.\n##9:20\n**Kevin:** not a real section",
+            ),
+        ]
+        assert all(m["thinking"] == "" for m in messages if m["role"] == "assistant")
+
+    @pytest.mark.parametrize("content", ["", "\n\n", "## 9:00\n\n"])
+    def test_empty_sections_skipped(self, tmp_path: Path, content: str) -> None:
+        """Blank logs and empty sections produce no messages."""
+        assert parse_markdown_conversation(write_log(tmp_path, content)) == []
+
+
+def agent_section(time_str: str, user: str, agent: str) -> str:
+    """One log_conversation entry."""
+    return f"\n## {time_str}\n**Kevin:** {user}\n\n**Agent:** {agent}\n"
+
+
+class TestReadLastAgentResponse:
+    """Test reading the last agent response from the end of a log."""
+
+    def test_small_log(self, tmp_path: Path) -> None:
+        """The last response is returned, thinking and earlier entries excluded."""
+        path = write_log(tmp_path, CONVERSATION_LOG + agent_section("9:30", "hi", "last one"))
+        assert read_last_agent_response(path) == "last one"
+
+    def test_log_larger_than_tail_window(self, tmp_path: Path) -> None:
+        """Only the tail is needed when the last response lies inside it."""
+        filler = "".join(
+            agent_section("8:00", f"question {i}", "x" * 200) for i in range(1000)
+        )
+        path = write_log(tmp_path, filler + agent_section("9:00", "q", "final answer"))
+        assert path.stat().st_size > _conversation_log.TAIL_BYTES
+        assert read_last_agent_response(path) == "final answer"
+
+    def test_response_straddles_tail_window(self, tmp_path: Path) -> None:
+        """A response starting before the window falls back to the full file."""
+        long_reply = "word " * (_conversation_log.TAIL_BYTES // 4)
+        content = agent_section("8:00", "older", "older reply") + agent_section(
+            "9:00", "tell me everything", long_reply
+        )
+        path = write_log(tmp_path, content)
+        assert read_last_agent_response(path) == long_reply.strip()
+
+    @pytest.mark.parametrize("split", [1, 5, len("**Agent:** ") - 1])
+    def test_marker_split_by_window_start(self, tmp_path: Path, split: int) -> None:
+        """A marker cut in half by the window start is still found."""
+        reply = "y" * 1000
+        content = agent_section("8:00", "older", "older reply") + agent_section(
+            "9:00", "q", reply
+        )
+        marker_pos = content.rindex("**Agent:** ")
+        # Pad the end (trailing whitespace is stripped from the reply) so the
+        # window start falls `split` bytes into the last marker
+        tail_len = len(content) - marker_pos - split
+        content += " " * (_conversation_log.TAIL_BYTES - tail_len)
+        path = write_log(tmp_path, content)
+        assert path.stat().st_size - _conversation_log.TAIL_BYTES == marker_pos + split
+        assert read_last_agent_response(path) == reply
+
+    def test_sees_appended_entry(self, tmp_path: Path) -> None:
+        """The cached response is dropped once the log changes."""
+        path = write_log(tmp_path, agent_section("9:00", "q", "first"))
+        assert read_last_agent_response(path) == "first"
+        with open(path, "a") as f:
+            f.write(agent_section("9:01", "q", "second"))
+        assert read_last_agent_response(path) == "second"
+
+    def test_missing_file(self, tmp_path: Path) -> None:
+        """A missing log has no last response."""
+        assert read_last_agent_response(tmp_path / "missing.md") is None
+
+
+class TestGetPreviewFromMarkdown:
+    """Test the conversation list preview (last user message)."""
+
+    def test_last_user_message(self, tmp_path: Path) -> None:
+        """Preview is the last user message, cut to max_length."""
+        path = write_log(tmp_path, agent_section("9:00", "first", "a") + agent_section(
+            "9:05", "second question here", "b"
+        ))
+        assert get_preview_from_markdown(path) == "second question here"
+        assert get_preview_from_markdown(path, max_length=6) == "second"
+
+    def test_message_straddles_tail_window(self, tmp_path: Path) -> None:
+        """A user message starting before the window falls back to the full file."""
+        long_question = "z" * _conversation_log.TAIL_BYTES
+        path = write_log(tmp_path, agent_section("9:00", long_question, "ok"))
+        assert get_preview_from_markdown(path) == "z" * 100
+
+
+class TestConversationLogWriter:
+    """Test queued and direct conversation log writes."""
+
+    def test_writer_flushes_on_stop(self, tmp_path: Path) -> None:
+        """Entries queued while the writer runs are written when it stops."""
+        log_dir = tmp_path / "conversations"
+
+        async def run() -> None:
+            main.start_log_writer()
+            main.log_conversation("hello", "hi there", conversations_dir=log_dir)
+            await main.stop_log_writer()
+
+        asyncio.run(run())
+        log_file = log_dir / f"{main.today_str()}.md"
+        assert read_last_agent_response(log_file) == "hi there"
+
+    def test_recreates_removed_directory(self, tmp_path: Path) -> None:
+        """A directory deleted after its first write is created again."""
+        log_file = tmp_path / "conversations" / "2026-01-31.md"
+        main._append_log_entries(log_file, ["first\n"])
+        shutil.rmtree(log_file.parent)
+
+        main._append_log_entries(log_file, ["second\n"])
+        assert log_file.read_text() == "second\n"
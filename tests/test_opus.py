@@ -0,0 +1,245 @@
+"""Tests for the in-process Ogg Opus muxer."""
+
+import asyncio
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+from voice_agent import _opus
+
+# First two pages of an ffmpeg/libopus Ogg Opus file (bitexact, serial 0)
+FFMPEG_HEAD_PAGE = bytes.fromhex(
+    "4f6767530002000000000000000000000000000000000228b57201134f70757348"
+    "6561640101380180bb0000000000"
+)
+FFMPEG_TAGS_PAGE = bytes.fromhex(
+    "4f6767530000000000000000000000000000010000004995be54012e4f70757354"
+    "6167730600000066666d7065670100000014000000656e636f6465723d4c617663"
+    "206c69626f707573"
+)
+
+
+def parse_pages(data: bytes) -> list[dict]:
+    """Split an Ogg stream into pages, checking each page's CRC."""
+    pages = []
+    pos = 0
+    while pos < len(data):
+        assert data[pos:pos + 4] == b"OggS"
+        version, flags, granule, serial, seq, crc, count = struct.unpack_from(
+            "<BBqIIIB", data, pos + 4
+        )
+        lacing = list(data[pos + 27:pos + 27 + count])
+        body_start = pos + 27 + count
+        end = body_start + sum(lacing)
+
+        page = bytearray(data[pos:end])
+        page[22:26] = b"\x00" * 4
+        assert _opus._ogg_crc(bytes(page)) == crc
+
+        packets, current, offset = [], b"", body_start
+        for size in lacing:
+            current += data[offset:offset + size]
+            offset += size
+            if size < 255:
+                packets.append(current)
+                current = b""
+
+        pages.append({
+            "version": version,
+            "flags": flags,
+            "granule": granule,
+            "serial": serial,
+            "seq": seq,
+            "lacing": lacing,
+            "packets": packets,
+        })
+        pos = end
+    return pages
+
+
+class FakeEncoder:
+    """Stand-in for opuslib.Encoder that returns a fixed-size packet per frame."""
+
+    lookahead = 156  # 312 at 48 kHz for 24 kHz input
+
+    def __init__(self, sample_rate: int, channels: int, application: str) -> None:
+        self.channels = channels
+        self.frames = 0
+
+    def encode_float(self, pcm: bytes, frame_size: int) -> bytes:
+        assert len(pcm) == frame_size * self.channels * 4
+        self.frames += 1
+        return bytes([self.frames % 256]) * 100
+
+
+@pytest.fixture
+def fake_opuslib(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Let _OggOpusEncoder run without libopus installed."""
+    monkeypatch.setattr(_opus, "opuslib", SimpleNamespace(Encoder=FakeEncoder))
+
+
+class TestOggCrc:
+    """Test the Ogg page checksum."""
+
+    def test_check_value(self) -> None:
+        """Matches the reference CRC (poly 0x04C11DB7, zero init/xorout)."""
+        assert _opus._ogg_crc(b"123456789") == 0x89A1897F
+
+    @pytest.mark.parametrize("page", [FFMPEG_HEAD_PAGE, FFMPEG_TAGS_PAGE])
+    def test_matches_ffmpeg_pages(self, page: bytes) -> None:
+        """Reproduces the checksum stored in pages written by ffmpeg."""
+        expected = struct.unpack_from("<I", page, 22)[0]
+        zeroed = page[:22] + b"\x00" * 4 + page[26:]
+        assert _opus._ogg_crc(zeroed) == expected
+
+    def test_rebuilds_ffmpeg_page(self) -> None:
+        """Building the same page from its packet gives identical bytes."""
+        rebuilt = _opus._ogg_page([FFMPEG_HEAD_PAGE[28:]], 0, 0, 0, _opus._BOS)
+        assert rebuilt == FFMPEG_HEAD_PAGE
+
+
+class TestOggPage:
+    """Test page layout and segment lacing."""
+
+    def test_255_byte_packet_ends_with_zero_segment(self) -> None:
+        """A packet that is an exact multiple of 255 needs a trailing 0."""
+        page = parse_pages(_opus._ogg_page([bytes(255)], 0, 1, 0))[0]
+        assert page["lacing"] == [255, 0]
+        assert page["packets"] == [bytes(255)]
+
+    def test_510_byte_packet(self) -> None:
+        """Two full segments plus the terminating 0."""
+        page = parse_pages(_opus._ogg_page([bytes(510)], 0, 1, 0))[0]
+        assert page["lacing"] == [255, 255, 0]
+        assert page["packets"] == [bytes(510)]
+
+    def test_multiple_packets(self) -> None:
+        """Packets are laced back to back and split apart again."""
+        packets = [b"a" * 10, b"b" * 300, b"c"]
+        page = parse_pages(_opus._ogg_page(packets, 960, 7, 3, _opus._EOS))[0]
+        assert page["lacing"] == [10, 255, 45, 1]
+        assert page["packets"] == packets
+        assert page["granule"] == 960
+        assert page["serial"] == 7
+        assert page["seq"] == 3
+        assert page["flags"] == _opus._EOS
+
+
+@pytest.mark.usefixtures("fake_opuslib")
+class TestOggOpusEncoder:
+    """Test the incremental Ogg Opus stream writer."""
+
+    def test_round_trip(self) -> None:
+        """Header, comment and audio pages parse back page by page."""
+        encoder = _opus._OggOpusEncoder(24000, 1)
+        frame_bytes = 480 * 4
+        encoder.feed(bytes(frame_bytes * 3 + 100))
+        pages = parse_pages(encoder.finish())
+
+        head, tags, audio = pages
+        assert head["flags"] == _opus._BOS
+        assert head["granule"] == 0
+        magic, version, channels, pre_skip, rate, gain, mapping = struct.unpack(
+            "<8sBBHIhB", head["packets"][0]
+        )
+        assert (magic, version, channels, pre_skip, rate, gain, mapping) == (
+            b"OpusHead", 1, 1, 312, 24000, 0, 0
+        )
+
+        assert tags["flags"] == 0
+        assert tags["packets"][0].startswith(b"OpusTags")
+
+        assert audio["flags"] == _opus._EOS
+        assert audio["packets"] == [bytes([i]) * 100 for i in (1, 2, 3, 4)]
+        # 3 frames plus 25 trailing samples, counted at 48 kHz after pre-skip
+        assert audio["granule"] == 312 + (3 * 480 + 25) * 2
+
+        assert {p["serial"] for p in pages} == {head["serial"]}
+
+    def test_chunked_feed_matches_single_feed(self) -> None:
+        """Feeding PCM in odd-sized chunks yields the same packets."""
+        pcm = bytes(480 * 4 * 5 + 12)
+
+        whole = _opus._OggOpusEncoder(24000, 1)
+        whole.feed(pcm)
+        chunked = _opus._OggOpusEncoder(24000, 1)
+        for start in range(0, len(pcm), 1000):
+            chunked.feed(pcm[start:start + 1000])
+
+        packets = [parse_pages(e.finish())[2]["packets"] for e in (whole, chunked)]
+        assert packets[0] == packets[1]
+
+    def test_sequence_and_granule_increments(self) -> None:
+        """Full pages carry consecutive sequence numbers and 20 ms granules."""
+        encoder = _opus._OggOpusEncoder(24000, 1)
+        # 100-byte packets take one lacing segment, so 255 fit on a page
+        encoder.feed(bytes(480 * 4 * 600))
+        pages = parse_pages(encoder.finish())
+
+        assert [p["seq"] for p in pages] == list(range(len(pages)))
+        audio = pages[2:]
+        assert [len(p["packets"]) for p in audio] == [255, 255, 90]
+        assert [p["granule"] for p in audio] == [
+            312 + 255 * 960,
+            312 + 510 * 960,
+            312 + 600 * 960,
+        ]
+        assert [p["flags"] for p in audio] == [0, 0, _opus._EOS]
+
+
+class FailingEncoder(FakeEncoder):
+    """FakeEncoder that fails on its second frame, like a libopus error."""
+
+    def encode_float(self, pcm: bytes, frame_size: int) -> bytes:
+        if self.frames == 1:
+            raise RuntimeError("opus error")
+        return super().encode_float(pcm, frame_size)
+
+
+async def pcm_chunks(*chunks: bytes):
+    """Async source of PCM chunks, as Kokoro yields them."""
+    for chunk in chunks:
+        yield chunk
+
+
+class TestEncodePcmStream:
+    """Test streaming encode and its ffmpeg fallback."""
+
+    @pytest.fixture
+    def ffmpeg_calls(self, monkeypatch: pytest.MonkeyPatch) -> list[bytes]:
+        """Record PCM sent to the ffmpeg encoder instead of running it."""
+        calls = []
+
+        async def fake_encode(data: bytes, **kwargs: object) -> bytes:
+            calls.append(data)
+            return b"ffmpeg"
+
+        monkeypatch.setattr(_opus._ffmpeg, "encode", fake_encode)
+        return calls
+
+    def test_libopus_failure_falls_back_to_ffmpeg(
+        self, monkeypatch: pytest.MonkeyPatch, ffmpeg_calls: list[bytes]
+    ) -> None:
+        """All PCM, including chunks fed before the error, goes to ffmpeg."""
+        monkeypatch.setattr(_opus, "opuslib", SimpleNamespace(Encoder=FailingEncoder))
+        chunks = [b"\x01" * 480 * 4, b"\x02" * 480 * 4, b"\x03" * 100]
+
+        audio = asyncio.run(
+            _opus.encode_pcm_stream(pcm_chunks(*chunks), sample_rate=24000)
+        )
+
+        assert audio == b"ffmpeg"
+        assert ffmpeg_calls == [b"".join(chunks)]
+
+    @pytest.mark.usefixtures("fake_opuslib")
+    def test_source_errors_propagate(self, ffmpeg_calls: list[bytes]) -> None:
+        """Errors from the PCM source are not mistaken for encoder failures."""
+
+        async def failing_source():
+            yield bytes(480 * 4)
+            raise ValueError("inference failed")
+
+        with pytest.raises(ValueError):
+            asyncio.run(_opus.encode_pcm_stream(failing_source(), sample_rate=24000))
+        assert ffmpeg_calls == []
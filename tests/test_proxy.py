@@ -0,0 +1,101 @@
+"""Tests for the proxy's conversation log parsing."""
+
+from pathlib import Path
+
+import pytest
+
+from voice_agent.proxy import get_preview_from_markdown, parse_markdown_conversation
+
+# A daily log as written by log_conversation, plus the edge cases the parser
+# has to tolerate: an entry before any timestamp, a multi-paragraph reply, an
+# agent-only section, a malformed header and a partial last section (no
+# agent reply, no trailing newline).
+CONVERSATION_LOG = """\
+**Kevin:** note written before any timestamp
+
+**Agent:** acknowledged
+
+## 9:05
+**Kevin:** What's on my calendar today?
+
+**Agent:** You have a standup at 10
+and lunch with Sam at noon.
+
+## 9:12 [text]
+**Kevin:** Remind me
+to call the dentist
+
+**Agent thinking:** The user wants a reminder.
+
+**Agent:** Done. I'll remind you at 3pm.
+
+This second paragraph is not part of the message.
+
+## 13:40
+**Agent:** Agent-only section.
+
+## 9:3
+**Kevin:** header above is malformed, so this belongs to the 13:40 section
+
+## 21:07
+**Kevin:** are you still
+there"""
+
+
+@pytest.fixture
+def log_file(tmp_path: Path) -> Path:
+    """Write the sample conversation log to a temp file."""
+    path = tmp_path / "2026-01-31.md"
+    path.write_text(CONVERSATION_LOG)
+    return path
+
+
+class TestParseMarkdownConversation:
+    """Test parsing a daily log into chat messages."""
+
+    def test_parses_sample_log(self, log_file: Path) -> None:
+        """Each section yields its user message, then its agent reply."""
+        assert parse_markdown_conversation(log_file) == [
+            {"role": "user", "content": "note written before any timestamp"},
+            {"role": "assistant", "content": "acknowledged"},
+            {"role": "user", "content": "What's on my calendar today?"},
+            {
+                "role": "assistant",
+                "content": "You have a standup at 10\nand lunch with Sam at noon.",
+            },
+            {"role": "user", "content": "Remind me\nto call the dentist"},
+            {"role": "assistant", "content": "Done. I'll remind you at 3pm."},
+            {
+                "role": "user",
+                "content": "header above is malformed, so this belongs to the 13:40 section",
+            },
+            {"role": "assistant", "content": "Agent-only section."},
+            {"role": "user", "content": "are you still\nthere"},
+        ]
+
+    def test_skips_thinking(self, log_file: Path) -> None:
+        """Agent thinking is not returned as a message."""
+        messages = parse_markdown_conversation(log_file)
+        assert not any("reminder." in m["content"] for m in messages)
+
+    def test_missing_file(self, tmp_path: Path) -> None:
+        """A missing log parses to no messages."""
+        assert parse_markdown_conversation(tmp_path / "missing.md") == []
+
+
+class TestGetPreviewFromMarkdown:
+    """Test the conversation list preview."""
+
+    def test_last_user_message(self, log_file: Path) -> None:
+        """Preview is the last user message, even in a partial section."""
+        assert get_preview_from_markdown(log_file) == "are you still\nthere"
+
+    def test_truncates(self, log_file: Path) -> None:
+        """Preview is cut to max_length."""
+        assert get_preview_from_markdown(log_file, max_length=7) == "are you"
+
+    def test_no_user_message(self, tmp_path: Path) -> None:
+        """Logs without a user message have an empty preview."""
+        path = tmp_path / "2026-02-01.md"
+        path.write_text("## 9:00\n**Agent:** hello\n")
+        assert get_preview_from_markdown(path) == ""
@@ -1,9 +1,12 @@
 """Tests for transcription module."""
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
 
+from voice_agent import transcribe
 from voice_agent.transcribe import build_hotwords_string
 from voice_agent.agents import VoiceAgentConfig, CommandConfig, AgentConfig
 
@@ -75,3 +78,39 @@ class TestBuildHotwords:
         result = build_hotwords_string(config)
         # Count occurrences of "diet"
         assert result.count("diet") == 1
+
+    def test_equal_configs_reuse_cached_string(self) -> None:
+        """Rebuilding from an identical config returns the cached string."""
+
+        def make_config() -> VoiceAgentConfig:
+            return VoiceAgentConfig(
+                keywords=["agent"],
+                commands={"log": CommandConfig(name="log", aliases=["add"])},
+                agents={"diet": AgentConfig(name="diet", path=Path("/tmp"))},
+            )
+
+        assert build_hotwords_string(make_config()) is build_hotwords_string(
+            make_config()
+        )
+
+
+class TestModelLoad:
+    """Test lazy model loading."""
+
+    def test_concurrent_getters_load_once(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Callers racing a load (e.g. startup warmup) share one model."""
+        loads = []
+
+        def slow_load() -> object:
+            time.sleep(0.05)
+            loads.append(object())
+            return loads[-1]
+
+        monkeypatch.setattr(transcribe, "_faster_model", None)
+        monkeypatch.setattr(transcribe, "_load_faster_model", slow_load)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            models = list(pool.map(lambda _: transcribe._get_faster_model(), range(4)))
+
+        assert len(loads) == 1
+        assert all(m is loads[0] for m in models)
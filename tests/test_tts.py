@@ -0,0 +1,53 @@
+"""Tests for local TTS model loading."""
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from voice_agent import tts_chatterbox, tts_kokoro
+
+
+class TestModelLoad:
+    """Test lazy model loading."""
+
+    def test_kokoro_concurrent_loads_share_pipeline(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Callers racing a pipeline load (e.g. the warmup) share one pipeline."""
+        loads = []
+
+        def slow_load(lang_code: str) -> object:
+            time.sleep(0.05)
+            loads.append(object())
+            return loads[-1]
+
+        monkeypatch.setattr(tts_kokoro, "_pipelines", OrderedDict())
+        monkeypatch.setattr(tts_kokoro, "_load_pipeline", slow_load)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            pipelines = list(pool.map(lambda _: tts_kokoro.load_model("a"), range(4)))
+
+        assert len(loads) == 1
+        assert all(p is loads[0] for p in pipelines)
+
+    def test_chatterbox_concurrent_loads_share_model(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Callers racing the model load share one model."""
+        loads = []
+
+        def slow_load() -> object:
+            time.sleep(0.05)
+            loads.append(object())
+            return loads[-1]
+
+        monkeypatch.setattr(tts_chatterbox, "_model", None)
+        monkeypatch.setattr(tts_chatterbox, "_load_model", slow_load)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            models = list(pool.map(lambda _: tts_chatterbox.load_model(), range(4)))
+
+        assert len(loads) == 1
+        assert all(m is loads[0] for m in models)